@@ -0,0 +1,309 @@
+'''
+Hashlife engine for the hexagonal game of life.
+
+In axial coordinates the hexagonal grid is a square grid where each cell
+has six neighbors: (+1,0), (+1,-1), (0,-1), (-1,0), (-1,+1), (0,+1). They
+are all within one row/column of the cell, so the Hashlife algorithm of
+Bill Gosper applies unchanged:
+  - the grid is a quadtree whose nodes are hash-consed (two identical
+    blocks are the same object), with q along the rows and r along the
+    columns
+  - the future of the center of a block of level k (2^k x 2^k cells) is
+    fully determined for up to 2^(k-2) generations, and is memoized
+
+Cells outside of the hexagonal map are stored as a third "wall" state:
+a wall is never alive and never born, so the bounded map of HexWorld is
+reproduced exactly while the blocks stay shareable.
+
+Only the direct neighbors count matters for the current rules (the
+extended term is derived from it), so they are reduced to the sets of
+direct counts (0 to 6) accepted for survival and for birth.
+'''
+
+import collections
+import numpy
+import hexarray
+
+DEAD = 0
+ALIVE = 1
+WALL = 2
+
+class Node:
+    """ Quadtree node of level k, covering 2^k x 2^k cells. Leaves (level 0)
+        hold a single cell state.
+    """
+    __slots__ = ('level', 'nw', 'ne', 'sw', 'se', 'population', 'state')
+
+    def __init__(self, level, nw, ne, sw, se, population, state=None):
+        self.level = level
+        self.nw = nw
+        self.ne = ne
+        self.sw = sw
+        self.se = se
+        self.population = population
+        self.state = state
+
+class HashlifeEngine:
+    """ Evolves the cells of an HexWorld with Hashlife.
+
+        advance(generations) jumps any number of generations at once, in
+        a time roughly logarithmic in the number of generations for worlds
+        made of still lifes and oscillators.
+
+        The memoized futures are kept in a LRU cache of at most max_cache
+        entries. When the number of canonical nodes exceeds max_nodes,
+        every table is dropped and the current world is interned again.
+        hits, misses, evictions and collections count the cache activity.
+
+        Cells colors are not tracked through the jumps: cells alive before
+        and after a jump keep their hue and fade as if they had survived,
+        the other ones are shown as newborn yellow cells.
+    """
+    def __init__(self, world, max_cache=1000000, max_nodes=2000000):
+        self.world = world
+        self.max_cache = max_cache
+        self.max_nodes = max_nodes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.collections = 0
+        # smallest root level with the map centered inside it
+        self.root_level = 2
+        while 2 ** (self.root_level - 1) < world.map_radius + 1:
+            self.root_level += 1
+        self.offset = 2 ** (self.root_level - 1)
+        self._reset_tables_()
+        self.rules = None
+        self.root = None
+        self.published = None
+
+    def _reset_tables_(self):
+        self.nodes = {}
+        self.results = collections.OrderedDict()
+        self.uniforms = {}
+        self.leaves = [ Node(0, None, None, None, None, int(s == ALIVE), s)
+                        for s in (DEAD, ALIVE, WALL) ]
+
+    def stats(self):
+        """ Returns the cache statistics in a dictionary."""
+        return { 'hits': self.hits, 'misses': self.misses,
+                 'evictions': self.evictions, 'collections': self.collections,
+                 'cache': len(self.results), 'nodes': len(self.nodes) }
+
+    def join(self, nw, ne, sw, se):
+        """ Returns the canonical node made of four quadrants."""
+        key = (nw, ne, sw, se)
+        node = self.nodes.get(key)
+        if node is None:
+            node = Node(nw.level + 1, nw, ne, sw, se,
+                        nw.population + ne.population + sw.population + se.population)
+            self.nodes[key] = node
+        return node
+
+    def uniform(self, state, level):
+        """ Returns the canonical node of the given level filled with a
+            single state.
+        """
+        node = self.uniforms.get( (state, level) )
+        if node is None:
+            if level == 0:
+                node = self.leaves[state]
+            else:
+                n = self.uniform(state, level - 1)
+                node = self.join(n, n, n, n)
+            self.uniforms[(state, level)] = node
+        return node
+
+    def center(self, node):
+        """ Returns the centered node of the level below."""
+        return self.join(node.nw.se, node.ne.sw, node.sw.ne, node.se.nw)
+
+    def expand(self, node):
+        """ Returns the node of the level above, centered on the given one
+            and surrounded by walls.
+        """
+        w = self.uniform(WALL, node.level - 1)
+        return self.join( self.join(w, w, w, node.nw), self.join(w, w, node.ne, w),
+                          self.join(w, node.sw, w, w), self.join(node.se, w, w, w) )
+
+    def build(self, grid):
+        """ Returns the node of a square array of cell states, whose size
+            is a power of two.
+        """
+        first = grid.flat[0]
+        if ( grid == first ).all():
+            return self.uniform( int(first), len(grid).bit_length() - 1 )
+        h = len(grid) // 2
+        return self.join( self.build(grid[:h, :h]), self.build(grid[:h, h:]),
+                          self.build(grid[h:, :h]), self.build(grid[h:, h:]) )
+
+    def alive_cells(self, node, i=0, j=0, cells=None):
+        """ Returns the list of (row, column) of the alive cells of a node."""
+        if cells is None:
+            cells = []
+        if node.population == 0:
+            return cells
+        if node.level == 0:
+            cells.append( (i, j) )
+            return cells
+        h = 2 ** (node.level - 1)
+        self.alive_cells(node.nw, i, j, cells)
+        self.alive_cells(node.ne, i, j + h, cells)
+        self.alive_cells(node.sw, i + h, j, cells)
+        self.alive_cells(node.se, i + h, j + h, cells)
+        return cells
+
+    def _check_rules_(self):
+        """ Drop the memoized futures if the rules have been modified."""
+        world = self.world
+        rules = ( hexarray.accepted_counts(world, world.rules_environment),
+                  hexarray.accepted_counts(world, world.rules_fertility) - {0} )
+        if rules != self.rules:
+            self.results.clear()
+            self.rules = rules
+
+    def _base_step_(self, node):
+        """ Returns the center (level 1) of a level 2 node after one
+            generation.
+        """
+        grid = [ [0] * 4 for i in range(4) ]
+        for qi, rj, quad in ( (0, 0, node.nw), (0, 2, node.ne),
+                              (2, 0, node.sw), (2, 2, node.se) ):
+            grid[qi][rj] = quad.nw.state
+            grid[qi][rj+1] = quad.ne.state
+            grid[qi+1][rj] = quad.sw.state
+            grid[qi+1][rj+1] = quad.se.state
+        survive, born = self.rules
+        result = []
+        for i, j in ( (1, 1), (1, 2), (2, 1), (2, 2) ):
+            state = grid[i][j]
+            if state != WALL:
+                count = ( (grid[i+1][j] == ALIVE) + (grid[i+1][j-1] == ALIVE) +
+                          (grid[i][j-1] == ALIVE) + (grid[i-1][j] == ALIVE) +
+                          (grid[i-1][j+1] == ALIVE) + (grid[i][j+1] == ALIVE) )
+                if state == ALIVE:
+                    state = ALIVE if count in survive else DEAD
+                else:
+                    state = ALIVE if count in born else DEAD
+            result.append(self.leaves[state])
+        return self.join(*result)
+
+    def step(self, node, j):
+        """ Returns the center of a node (level k, k >= 2) after 2^j
+            generations, with j <= k-2.
+        """
+        if node.population == 0:
+            # without alive cells nothing is ever born
+            return self.center(node)
+        key = (node, j)
+        result = self.results.get(key)
+        if result is not None:
+            self.hits += 1
+            self.results.move_to_end(key)
+            return result
+        self.misses += 1
+
+        if node.level == 2:
+            result = self._base_step_(node)
+        else:
+            nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+            sub = [ nw, self.join(nw.ne, ne.nw, nw.se, ne.sw), ne,
+                    self.join(nw.sw, nw.se, sw.nw, sw.ne), self.center(node),
+                    self.join(ne.sw, ne.se, se.nw, se.ne),
+                    sw, self.join(sw.ne, se.nw, sw.se, se.sw), se ]
+            if j == node.level - 2:
+                # full speed: two half steps
+                s = [ self.step(n, j - 1) for n in sub ]
+                quads = self._quadrants_(s)
+                result = self.join( *[ self.step(n, j - 1) for n in quads ] )
+            else:
+                s = [ self.center(n) for n in sub ]
+                quads = self._quadrants_(s)
+                result = self.join( *[ self.step(n, j) for n in quads ] )
+
+        self.results[key] = result
+        if len(self.results) > self.max_cache:
+            self.results.popitem(last=False)
+            self.evictions += 1
+        return result
+
+    def _quadrants_(self, s):
+        """ Returns the four overlapping nodes made of a 3x3 grid of nodes."""
+        return ( self.join(s[0], s[1], s[3], s[4]), self.join(s[1], s[2], s[4], s[5]),
+                 self.join(s[3], s[4], s[6], s[7]), self.join(s[4], s[5], s[7], s[8]) )
+
+    def _collect_(self):
+        """ Drop every table and intern the current root again."""
+        grid = self._grid_()
+        self._reset_tables_()
+        self.rules = None
+        self.root = self.build(grid)
+        self.collections += 1
+
+    def _grid_(self):
+        """ Returns the array of cell states of the root."""
+        size = 2 ** self.root_level
+        q, r = numpy.mgrid[0:size, 0:size] - self.offset
+        radius = self.world.map_radius
+        inside = numpy.maximum( numpy.maximum( abs(q), abs(r) ), abs(q+r) ) <= radius
+        grid = numpy.where(inside, DEAD, WALL).astype(numpy.int8)
+        if self.root is not None:
+            for i, j in self.alive_cells(self.root):
+                grid[i, j] = ALIVE
+        return grid
+
+    def load(self):
+        """ Build the root node from the world cells."""
+        self.root = None
+        grid = self._grid_()
+        for q, r in self.world.cells:
+            grid[q + self.offset, r + self.offset] = ALIVE
+        self.root = self.build(grid)
+        self.published = self.world.cells
+
+    def publish(self, generations):
+        """ Write the root cells back to the world."""
+        world = self.world
+        topology = world.topology
+        cells = set( (i - self.offset, j - self.offset) for i, j in self.alive_cells(self.root) )
+        births = topology.cells_ids(cells - world.cells)
+        deaths = topology.cells_ids(world.cells - cells)
+        kept = topology.cells_ids(cells & world.cells)
+        intensity = world.intensity[kept]
+        for k in range( 0, min(generations, 10) ):
+            intensity = hexarray.fade(intensity)
+        world.intensity[kept] = intensity
+        world.hue[deaths] = 0
+        world.intensity[deaths] = 0
+        world.hue[births] = 60
+        world.intensity[births] = 100
+        if world.cells is self.published:
+            world.births = births
+            world.deaths = deaths
+        world.cells = cells
+        self.published = cells
+
+    def advance(self, generations):
+        """ Evolve the world by the given number of generations."""
+        if self.world.cells is not self.published:
+            self.load()
+        self._check_rules_()
+        j = 0
+        remaining = generations
+        while remaining > 0:
+            if remaining & 1:
+                node = self.root
+                while node.level < j + 2:
+                    node = self.expand(node)
+                node = self.step(self.expand(node), j)
+                while node.level > self.root_level:
+                    node = self.center(node)
+                self.root = node
+            remaining >>= 1
+            j += 1
+        if len(self.nodes) > self.max_nodes:
+            self._collect_()
+        self.publish(generations)
+
+    def evolve(self):
+        self.advance(1)
@@ -0,0 +1,83 @@
+'''
+Activity tiles engine for the hexagonal game of life.
+
+Worlds usually settle into large areas of still lifes and oscillators,
+with a few active zones. The delta engine already evaluates only the
+cells born or dead and their neighbors: the settled areas of the map
+sleep, and the cost of a generation follows the activity of the world.
+
+This engine is the delta engine, also keeping track of where the world
+is active. The map is split into square tiles of the axial (q, r) plane,
+of size x size cells, and each tile counts its activity, the number of
+cells born and dead in it decayed at every generation, that
+HexMap.draw_activity shows as a heatmap. A tile is asleep when none of
+its cells is evaluated at next generation.
+'''
+
+import numpy
+import hexdelta
+
+# Width of the tiles, in cells
+TILE_SIZE = 4
+# Part of the activity of a tile kept at each generation
+DECAY = 0.9
+# The activity is stored divided by the decay accumulated since this
+# scale, so that only the tiles changed are updated
+MIN_SCALE = 1e-100
+
+class ActivityEngine(hexdelta.DeltaEngine):
+    """ Evolves the cells of an HexWorld like the delta engine, and counts
+        the activity of the tiles of the map.
+
+        The engine options are the size of the tiles and the decay of the
+        activity counters.
+
+        The data structures used, besides the ones of DeltaEngine, are:
+          - tile = int32 array : tile index of every cell id
+          - activity = float array : cells born and dead in each tile,
+            decayed at every generation, divided by scale
+    """
+    def __init__(self, world, size=TILE_SIZE, decay=DECAY):
+        if size < 1:
+            raise ValueError('the tiles need at least one cell')
+        super(ActivityEngine, self).__init__(world)
+        self.tile_size = size
+        self.decay = decay
+        width = ( 2 * world.map_radius + size ) // size
+        coords = world.topology.coords
+        tq = ( coords[:, 0] + world.map_radius ) // size
+        tr = ( coords[:, 1] + world.map_radius ) // size
+        self.tile = ( tq * width + tr ).astype(numpy.int32)
+        self.tiles = width * width
+        self.populated = numpy.count_nonzero( numpy.bincount(self.tile) )
+        self.activity = numpy.zeros(self.tiles)
+        self.scale = 1.0
+
+    def load(self):
+        super(ActivityEngine, self).load()
+        self.activity.fill(0)
+        self.scale = 1.0
+
+    def sleeping(self):
+        """ Returns the part of the tiles holding cells that are asleep."""
+        awake = numpy.bincount( self.tile[self.pending], minlength=self.tiles )
+        return 1.0 - numpy.count_nonzero(awake) / self.populated
+
+    def cells_activity(self):
+        """ Returns the activity of the tile of every cell id, relative to
+            the most active tile, from 0 to 1.
+        """
+        top = self.activity.max()
+        if top == 0:
+            return numpy.zeros(len(self.tile))
+        return self.activity[self.tile] / top
+
+    def evolve(self):
+        super(ActivityEngine, self).evolve()
+        world = self.world
+        self.scale *= self.decay
+        if self.scale < MIN_SCALE:
+            self.activity *= self.scale
+            self.scale = 1.0
+        changed = self.tile[ numpy.concatenate( (world.births, world.deaths) ) ]
+        numpy.add.at(self.activity, changed, 1.0 / self.scale)
@@ -0,0 +1,252 @@
+'''
+Dense array engine for the hexagonal game of life.
+
+The hexagonal map is stored in a square 2D array indexed by the axial
+coordinates (q, r) of the cells, with a boolean mask marking which entries
+actually belong to the hexagon. The array is padded with one row/column
+of dead cells on each side so that the neighbors of every cell can be
+accessed by slicing, without any wrapping or bound checks.
+
+Neighbor counts are then computed for the whole map at once by summing
+six shifted views of the array (one per hexu.directions), and the rules
+are applied with lookup tables indexed by these counts.
+'''
+
+import numpy
+import hexu
+
+def rule_table(rule, size):
+    """ Returns a boolean lookup table of the given size, true for the
+        neighbors counts belonging to the rule.
+    """
+    table = numpy.zeros(size, dtype=bool)
+    table[ [n for n in rule if 0 <= n < size] ] = True
+    return table
+
+def rule_tables(world):
+    """ Returns the (survive, born) lookup tables of the world rules,
+        large enough for any neighbors count, extended term included.
+    """
+    size = 7
+    if world.use_extended_neighbors:
+        size += 6 // world.extended_neighbors_factor
+    survive = rule_table(world.rules_environment, size)
+    born = rule_table(world.rules_fertility, size)
+    # a cell without any living neighbor is never a birth candidate
+    born[0] = False
+    return survive, born
+
+def extended_factor(world):
+    """ Returns the extended neighbors factor, 0 when they are not used."""
+    return world.extended_neighbors_factor if world.use_extended_neighbors else 0
+
+def neighbors_count(alive, factor=0):
+    """ Returns the number of alive direct neighbors of every cell of a
+        padded axial array. The padding border of the result is zero.
+
+        With a factor, the extended neighbors term is added. Same as the
+        set engine, it is derived from the direct neighbors count.
+    """
+    n, m = alive.shape
+    count = numpy.zeros_like(alive)
+    for dq, dr in hexu.directions:
+        count[1:-1, 1:-1] += alive[1+dq:n-1+dq, 1+dr:m-1+dr]
+    if factor:
+        count += count // factor
+    return count
+
+def accepted_counts(world, rule):
+    """ Returns the direct neighbors counts (0 to 6) accepted by a rule
+        once the extended neighbors term is added.
+    """
+    factor = extended_factor(world)
+    return frozenset( k for k in range(0, 7)
+                        if ( k + k // factor if factor else k ) in rule )
+
+def grid_neighbors(index, width):
+    """ Returns the (n, 6) table of the direct neighbors of cells given by
+        their flat indices in a padded axial array of the given width, in
+        the order of hexu.directions.
+    """
+    offsets = numpy.array( [ dq * width + dr for dq, dr in hexu.directions ] )
+    return numpy.asarray(index)[:, None] + offsets
+
+def parents_hue(alive, hue, neighbors):
+    """ Returns the hue of newborn cells: the average hue of their two
+        first alive parents, in the order of hexu.directions. neighbors is
+        the (births, 6) table of their direct neighbors, as indices of the
+        alive and hue arrays in the order of hexu.directions, -1 standing
+        for the neighbors outside of the map.
+    """
+    hue_sum = numpy.zeros(len(neighbors), dtype=numpy.int32)
+    parents = numpy.zeros(len(neighbors), dtype=numpy.int32)
+    for k in range(0, 6):
+        n = neighbors[:, k]
+        take = ( n >= 0 ) & ( alive[n] == 1 ) & ( parents < 2 )
+        hue_sum += numpy.where(take, hue[n], 0)
+        parents += take
+    return ( hue_sum // numpy.maximum(parents, 1) ) % 360
+
+def fade(intensity):
+    """ Returns the intensities of cells alive one generation later: 100
+        drops to 70 and then by 5 while above 25.
+    """
+    return numpy.where(intensity == 100, 70,
+                numpy.where(intensity > 25, intensity - 5, intensity))
+
+def faded(intensity, times):
+    """ Returns the intensities of cells alive for a number of generations
+        (one per cell, or a single value), see fade, the intensity of a
+        newborn being 100.
+    """
+    intensity = numpy.asarray(intensity, dtype=numpy.int16)
+    times = numpy.broadcast_to(times, intensity.shape)
+    # after 50 generations every intensity reached its final value
+    for k in range( 0, min( int( times.max(initial=0) ), 50 ) ):
+        intensity = numpy.where( times > k, fade(intensity), intensity )
+    return intensity.astype(numpy.uint8)
+
+def next_state(alive, hue, intensity, survivors, births):
+    """ Returns the new (alive, hue, intensity) arrays from boolean arrays
+        of the surviving and newborn cells. The given arrays are not
+        modified.
+    """
+    bq, br = numpy.nonzero(births)
+    birth_hue = parents_hue( alive.reshape(-1), hue.reshape(-1),
+                             grid_neighbors( bq * alive.shape[1] + br, alive.shape[1] ) )
+    next_intensity = numpy.where(survivors, fade(intensity), 0).astype(numpy.uint8)
+    next_intensity[bq, br] = 100
+    next_hue = numpy.where(survivors, hue, 0).astype(numpy.int16)
+    next_hue[bq, br] = birth_hue
+    return ( survivors | births ).astype(numpy.uint8), next_hue, next_intensity
+
+def step(alive, hue, intensity, mask, survive, born, factor=0):
+    """ Computes one generation of a padded axial array, or of a band of
+        rows of it: the first and last rows are then the halo rows, only
+        read from. Returns the new (alive, hue, intensity) arrays, whose
+        first and last rows and columns are meaningless.
+    """
+    count = neighbors_count(alive, factor)
+    was_alive = alive.astype(bool)
+    survivors = was_alive & survive[count]
+    births = ~was_alive & born[count] & mask
+    return next_state(alive, hue, intensity, survivors, births)
+
+class ArrayEngine:
+    """ Evolves the cells of an HexWorld on a masked 2D axial array.
+
+        The engine owns the array state and publishes the `cells`, `hue`
+        and `intensity` of the world after each generation. If the world cells
+        are replaced (random, cluster, clear or a plain assignment), the
+        array state is reloaded from them before the next evolution.
+        Modifying the published `cells` set in place is not detected.
+    """
+    def __init__(self, world):
+        self.world = world
+        self.offset = world.map_radius + 1
+        size = 2 * world.map_radius + 3
+        q, r = numpy.mgrid[-self.offset:self.offset+1, -self.offset:self.offset+1]
+        self.mask = numpy.maximum( numpy.maximum( abs(q), abs(r) ),
+                                   abs(q+r) ) <= world.map_radius
+        self.alive = numpy.zeros((size, size), dtype=numpy.uint8)
+        self.hue = numpy.zeros((size, size), dtype=numpy.int16)
+        self.intensity = numpy.zeros((size, size), dtype=numpy.uint8)
+        # position of every cell id in the arrays
+        coords = world.topology.coords
+        self.cq = coords[:, 0] + self.offset
+        self.cr = coords[:, 1] + self.offset
+        # cells set last published to the world
+        self.published = None
+
+    def load(self):
+        """ Reset the array state from the world cells and colors."""
+        self.alive.fill(0)
+        self.hue.fill(0)
+        self.intensity.fill(0)
+        world = self.world
+        ids = world.topology.cells_ids(world.cells)
+        q = self.cq[ids]
+        r = self.cr[ids]
+        self.alive[q, r] = 1
+        self.hue[q, r] = world.hue[ids]
+        self.intensity[q, r] = world.intensity[ids]
+        self.published = self.world.cells
+
+    def publish(self, previous=None):
+        """ Write the array state back to the world cells and colors.
+            When the alive array of the previous generation is given, the
+            world births and deaths are updated too.
+        """
+        if previous is not None:
+            index = self.world.topology.index
+            q, r = numpy.nonzero(self.alive > previous)
+            self.world.births = index[q - 1, r - 1]
+            q, r = numpy.nonzero(self.alive < previous)
+            self.world.deaths = index[q - 1, r - 1]
+        q, r = numpy.nonzero(self.alive)
+        self.world.cells = set( zip( (q - self.offset).tolist(), (r - self.offset).tolist() ) )
+        self.world.hue[:] = self.hue[self.cq, self.cr]
+        self.world.intensity[:] = self.intensity[self.cq, self.cr]
+        self.published = self.world.cells
+
+    def rule_tables(self):
+        """ Returns the (survive, born) lookup tables of the world rules."""
+        return rule_tables(self.world)
+
+    def count(self, alive):
+        """ Returns the neighbors count of every cell of a padded array."""
+        return neighbors_count(alive, extended_factor(self.world))
+
+    def evolve(self):
+        world = self.world
+        if world.cells is not self.published:
+            self.load()
+        metrics = world.metrics
+        if metrics is not None:
+            metrics.mark('rebuild')
+        # step, split in its phases
+        survive, born = self.rule_tables()
+        previous = self.alive
+        count = self.count(previous)
+        was_alive = previous.astype(bool)
+        survivors = was_alive & survive[count]
+        births = ~was_alive & born[count] & self.mask
+        if metrics is not None:
+            metrics.mark('count')
+        self.alive, self.hue, self.intensity = next_state( previous, self.hue,
+                self.intensity, survivors, births )
+        if metrics is not None:
+            metrics.mark('color')
+        self.publish(previous)
+        if metrics is not None:
+            metrics.mark('rebuild')
+
+    def advance(self, generations):
+        """ Evolve the world by the given number of generations, publishing
+            the last one only. The arrays are updated in place, and the
+            intensities are only computed at the end from the age of the
+            cells. Births and deaths are the cells changed by the jump.
+        """
+        world = self.world
+        if world.cells is not self.published:
+            self.load()
+        survive, born = self.rule_tables()
+        previous = self.alive.copy()
+        alive = self.alive
+        # generation each cell was last born at during the jump, or -1
+        born_at = numpy.full(alive.shape, -1, dtype=numpy.int32)
+        for g in range(0, generations):
+            count = self.count(alive)
+            was_alive = alive.astype(bool)
+            births = ~was_alive & born[count] & self.mask
+            bq, br = numpy.nonzero(births)
+            self.hue[bq, br] = parents_hue( alive.reshape(-1), self.hue.reshape(-1),
+                                            grid_neighbors( bq * alive.shape[1] + br, alive.shape[1] ) )
+            born_at[bq, br] = g
+            alive[:] = ( was_alive & survive[count] ) | births
+        newborn = born_at >= 0
+        times = numpy.where(newborn, generations - 1 - born_at, generations)
+        intensity = faded( numpy.where(newborn, 100, self.intensity), times )
+        self.intensity = numpy.where(alive == 1, intensity, 0).astype(numpy.uint8)
+        self.hue = numpy.where(alive == 1, self.hue, 0).astype(numpy.int16)
+        self.publish(previous)
@@ -0,0 +1,189 @@
+'''
+Bitboard engine for the hexagonal game of life.
+
+The padded axial array of hexarray is packed one bit per cell: each row
+(constant q) is stored as a few uint64 words, bit j of word w holding the
+cell at r index 64*w + j. Neighbors along q are obtained by selecting
+other rows, and neighbors along r by shifting the words by one bit (with
+the carry moved across adjacent words).
+
+The six shifted boards are then added with bit-sliced full adders: the
+direct neighbors count (0 to 6) of 64 cells at once is held in three bit
+planes. The rules are turned into the list of direct counts they accept,
+so the extended neighbors term never needs more than these three planes.
+
+The state of the cells stays on the bitboard: only the cells born, dead
+or still fading, found from the set bits of the new boards, are updated
+in the byte colors arrays and published to the world.
+'''
+
+import numpy
+import hexu
+import hexarray
+
+def _full_adder_(a, b, c):
+    """ Returns (sum, carry) of three bit planes."""
+    t = a ^ b
+    return t ^ c, (a & b) | (c & t)
+
+class BitboardEngine(hexarray.ArrayEngine):
+    """ Evolves the cells of an HexWorld on a bit-packed axial grid.
+
+        The neighbors counting and the rules run on the bitboard. The cells
+        colors are still kept in the byte arrays of ArrayEngine, only
+        written at the cells born, dead and fading. The world cells are
+        updated in place.
+
+        The data structures used, besides the ones of ArrayEngine, are:
+          - board = uint64 array (rows, words) : cells alive
+          - board_mask = uint64 array (rows, words) : cells of the map
+          - cell_ids = int32 array : id of the cell at every flat index of
+            the byte arrays, or -1
+          - young = array( index, ... ) : flat indices of the cells alive
+            still fading
+    """
+    def __init__(self, world):
+        super(BitboardEngine, self).__init__(world)
+        self.width = self.mask.shape[1]
+        self.words = ( self.width + 63 ) // 64
+        self.board_mask = self.pack(self.mask)
+        self.board = numpy.zeros_like(self.board_mask)
+        self.cell_ids = numpy.full(self.mask.size, -1, dtype=numpy.int32)
+        self.cell_ids[ self.cq * self.width + self.cr ] = numpy.arange( len(self.cq) )
+        self.young = numpy.zeros(0, dtype=numpy.intp)
+
+    def pack(self, grid):
+        """ Returns the bitboard of a boolean axial array."""
+        rows = numpy.zeros( (grid.shape[0], 64 * self.words), dtype=bool )
+        rows[:, :self.width] = grid
+        packed = numpy.packbits(rows, axis=1, bitorder='little')
+        return packed.view('<u8').astype(numpy.uint64)
+
+    def positions(self, board):
+        """ Returns the increasing flat indices in the byte arrays of the
+            cells set in a bitboard. Only the non zero words are unpacked.
+        """
+        rows, words = numpy.nonzero(board)
+        bits = numpy.unpackbits( board[rows, words].astype('<u8').view(numpy.uint8).reshape(-1, 8),
+                                 axis=1, bitorder='little' )
+        k, bit = numpy.nonzero(bits)
+        return rows[k] * self.width + 64 * words[k] + bit
+
+    def load(self):
+        super(BitboardEngine, self).load()
+        self.board = self.pack( self.alive.astype(bool) )
+        self.young = numpy.flatnonzero( ( self.alive == 1 ) & ( self.intensity > 25 ) )
+
+    def _shift_(self, board, dq, dr):
+        """ Returns the board where each cell holds its (dq, dr) neighbor."""
+        n = board.shape[0]
+        rows = numpy.zeros_like(board)
+        rows[1:-1] = board[1+dq:n-1+dq]
+        if dr == 1:
+            shifted = rows >> numpy.uint64(1)
+            shifted[:, :-1] |= rows[:, 1:] << numpy.uint64(63)
+        elif dr == -1:
+            shifted = rows << numpy.uint64(1)
+            shifted[:, 1:] |= rows[:, :-1] >> numpy.uint64(63)
+        else:
+            shifted = rows
+        return shifted
+
+    def neighbors_planes(self):
+        """ Returns the three bit planes (weights 1, 2 and 4) of the
+            direct neighbors count of every cell.
+        """
+        x = [ self._shift_(self.board, dq, dr) for dq, dr in hexu.directions ]
+        s1, c1 = _full_adder_(x[0], x[1], x[2])
+        s2, c2 = _full_adder_(x[3], x[4], x[5])
+        b0 = s1 ^ s2
+        b1, b2 = _full_adder_(c1, c2, s1 & s2)
+        return b0, b1, b2
+
+    def _rule_board_(self, planes, counts):
+        """ Returns the board of the cells whose count belongs to counts."""
+        result = numpy.zeros_like(self.board)
+        for k in counts:
+            match = self.board_mask.copy()
+            for bit, plane in enumerate(planes):
+                match &= plane if k & (1 << bit) else ~plane
+            result |= match
+        return result
+
+    def _step_(self, metrics=None):
+        """ Computes the next generation on the bitboard, and the colors of
+            the cells changed in the byte arrays. Returns the flat indices
+            of the births, of the deaths and of the cells faded.
+        """
+        world = self.world
+        planes = self.neighbors_planes()
+        survive = self._rule_board_( planes, hexarray.accepted_counts(world, world.rules_environment) )
+        # a cell without any living neighbor is never a birth candidate
+        born = self._rule_board_( planes, hexarray.accepted_counts(world, world.rules_fertility) - {0} )
+        births = ~self.board & born
+        deaths = self.board & ~survive
+        self.board = ( self.board & survive ) | births
+        births = self.positions(births)
+        deaths = self.positions(deaths)
+        if metrics is not None:
+            metrics.mark('count')
+
+        # newborn colors, from the parents of the previous generation
+        birth_hue = hexarray.parents_hue( self.alive.reshape(-1), self.hue.reshape(-1),
+                                          hexarray.grid_neighbors(births, self.width) )
+        alive = self.alive.reshape(-1)
+        hue = self.hue.reshape(-1)
+        intensity = self.intensity.reshape(-1)
+        alive[deaths] = 0
+        hue[deaths] = 0
+        intensity[deaths] = 0
+        young = self.young[ alive[self.young] == 1 ]
+        intensity[young] = hexarray.fade( intensity[young] )
+        alive[births] = 1
+        hue[births] = birth_hue
+        intensity[births] = 100
+        self.young = numpy.concatenate( ( young[ intensity[young] > 25 ], births ) )
+        if metrics is not None:
+            metrics.mark('color')
+        return births, deaths, young
+
+    def _publish_(self, births, deaths, changed):
+        """ Apply the births and deaths to the world cells, in place, and
+            copy the colors of the changed cells, all given as flat
+            indices.
+        """
+        world = self.world
+        births = self.cell_ids[births]
+        deaths = self.cell_ids[deaths]
+        world.cells.difference_update( world.topology.cell_coords(deaths) )
+        world.cells.update( world.topology.cell_coords(births) )
+        world.births = births
+        world.deaths = deaths
+        world.hue[ self.cell_ids[changed] ] = self.hue.reshape(-1)[changed]
+        world.intensity[ self.cell_ids[changed] ] = self.intensity.reshape(-1)[changed]
+
+    def evolve(self):
+        if self.world.cells is not self.published:
+            self.load()
+        metrics = self.world.metrics
+        if metrics is not None:
+            metrics.mark('rebuild')
+        births, deaths, faded = self._step_(metrics)
+        self._publish_( births, deaths, numpy.concatenate( (births, deaths, faded) ) )
+        if metrics is not None:
+            metrics.mark('rebuild')
+
+    def advance(self, generations):
+        """ Evolve the world by the given number of generations on the
+            bitboard, publishing the last one only. Births and deaths are
+            the cells changed by the jump.
+        """
+        if self.world.cells is not self.published:
+            self.load()
+        previous = self.board.copy()
+        for g in range(0, generations):
+            self._step_()
+        births = self.positions(self.board & ~previous)
+        deaths = self.positions(previous & ~self.board)
+        # the colors of every cell may have changed during the jump
+        self._publish_( births, deaths, self.cq * self.width + self.cr )
@@ -0,0 +1,230 @@
+'''
+Checkpoints of an HexWorld.
+
+A checkpoint file holds a header followed by any number of snapshots of
+a world of a given map radius, appended one after the other, so that a
+long run can be saved every N generations and replayed or scrubbed
+later.
+
+Layout, little endian, every section padded to 8 bytes:
+  - header: magic 'HEXCA\\0', format version (uint16), map radius
+    (uint32)
+  - snapshot: magic 'SNAP', size of the snapshot in bytes (uint64),
+    cycles (uint64), population (uint32), use_extended_neighbors
+    (uint8), extended_neighbors_factor (uint8), sizes in bytes of the
+    environment and fertility rules masks (uint8 each), followed by:
+      - the environment then the fertility rules, as little endian bit
+        masks of these sizes, bit n being set for the count n
+      - the cells alive, one bit per cell id (numpy.packbits, little
+        bit order)
+      - the hue (uint16) then the intensity (uint8) of the cells alive,
+        in increasing id order
+      - the size of the snapshot again (uint64), written last
+
+The potential population is not stored, it is recomputed from the cells
+alive. A snapshot whose trailing size is missing or differs was not
+completely written: it ends the file, and CheckpointWriter truncates it
+before appending the next ones.
+
+Files are read through mmap: opening a checkpoint only reads the
+snapshots headers, and the arrays of a snapshot are views of the file.
+
+usage:
+
+  writer = hexcheckpoint.CheckpointWriter('run.hexca', world.map_radius)
+  while True:
+      world.evolve()
+      if world.cycles % 100 == 0:
+          writer.write(world)
+
+  checkpoint = hexcheckpoint.Checkpoint('run.hexca')
+  world = checkpoint.load(-1)
+'''
+
+import mmap
+import os
+import struct
+import numpy
+import hexworld
+
+MAGIC = b'HEXCA\0'
+VERSION = 3
+HEADER = struct.Struct('<6sHI4x')
+SNAPSHOT = struct.Struct('<4sQQIBBBB4x')
+SNAPSHOT_MAGIC = b'SNAP'
+TRAILER = struct.Struct('<Q')
+
+def _padded_(size):
+    return ( size + 7 ) // 8 * 8
+
+def rule_mask(rule):
+    """ Returns the little endian bit mask of a rule, bit n being set for
+        the count n, as bytes.
+    """
+    mask = 0
+    for n in rule:
+        if n < 0:
+            raise ValueError('rule count out of range: %r' % n)
+        mask |= 1 << n
+    size = ( mask.bit_length() + 7 ) // 8
+    if size > 255:
+        raise ValueError('rule count out of range: %r' % max(rule))
+    return mask.to_bytes(size, 'little')
+
+def mask_rule(mask):
+    """ Returns the rule of a bit mask."""
+    mask = int.from_bytes(mask, 'little')
+    return set( n for n in range(0, mask.bit_length()) if mask & (1 << n) )
+
+def encode(world):
+    """ Returns the bytes of a snapshot of the world."""
+    ids = numpy.sort( world.topology.cells_ids(world.cells) )
+    alive = numpy.zeros(len(world.topology), dtype=numpy.uint8)
+    alive[ids] = 1
+    bits = numpy.packbits(alive, bitorder='little')
+    environment = rule_mask(world.rules_environment)
+    fertility = rule_mask(world.rules_fertility)
+    sections = [ environment + fertility,
+                 bits.tobytes(),
+                 world.hue[ids].astype('<u2').tobytes(),
+                 world.intensity[ids].astype(numpy.uint8).tobytes() ]
+    body = b''.join( s + bytes( _padded_(len(s)) - len(s) ) for s in sections )
+    size = SNAPSHOT.size + len(body) + TRAILER.size
+    header = SNAPSHOT.pack( SNAPSHOT_MAGIC, size, world.cycles, len(ids),
+                            int(world.use_extended_neighbors), world.extended_neighbors_factor,
+                            len(environment), len(fertility) )
+    return header + body + TRAILER.pack(size)
+
+def scan(buffer):
+    """ Returns the offsets of the complete snapshots of a checkpoint
+        file content, and the offset where the last one ends.
+    """
+    offsets = []
+    offset = HEADER.size
+    while offset + SNAPSHOT.size <= len(buffer):
+        magic, length = struct.unpack_from('<4sQ', buffer, offset)
+        if ( magic != SNAPSHOT_MAGIC or length < SNAPSHOT.size + TRAILER.size or
+             offset + length > len(buffer) or
+             TRAILER.unpack_from(buffer, offset + length - TRAILER.size)[0] != length ):
+            # a partially written snapshot ends the file
+            break
+        offsets.append(offset)
+        offset += length
+    return offsets, offset
+
+def save(world, path):
+    """ Write a checkpoint file holding a single snapshot of the world."""
+    with open(path, 'wb') as f:
+        f.write( HEADER.pack(MAGIC, VERSION, world.map_radius) )
+        f.write( encode(world) )
+
+class CheckpointWriter:
+    """ Appends snapshots of worlds of a given radius to a checkpoint file,
+        created if missing. A snapshot partially written at the end of an
+        existing file, by a run interrupted while writing it, is removed.
+    """
+    def __init__(self, path, map_radius):
+        self.path = path
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'r+b') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    magic, version, radius = HEADER.unpack_from(buffer, 0)
+                    if magic != MAGIC or version != VERSION:
+                        raise ValueError('not a version %d checkpoint: %s' % (VERSION, path))
+                    if radius != map_radius:
+                        raise ValueError('checkpoint of radius %d, not %d' % (radius, map_radius))
+                    end = scan(buffer)[1]
+                    size = len(buffer)
+                if end < size:
+                    f.truncate(end)
+        else:
+            with open(path, 'wb') as f:
+                f.write( HEADER.pack(MAGIC, VERSION, map_radius) )
+        self.map_radius = map_radius
+
+    def write(self, world):
+        if world.map_radius != self.map_radius:
+            raise ValueError('world of radius %d, not %d' % (world.map_radius, self.map_radius))
+        with open(self.path, 'ab') as f:
+            f.write( encode(world) )
+
+class Snapshot:
+    """ A snapshot of a checkpoint file. The arrays are views of the file
+        mapping, read only when accessed.
+    """
+    def __init__(self, buffer, offset, size):
+        ( magic, length, self.cycles, self.population, extended,
+          self.extended_neighbors_factor, environment, fertility ) = SNAPSHOT.unpack_from(buffer, offset)
+        rules = offset + SNAPSHOT.size
+        self.rules_environment = mask_rule( buffer[rules:rules + environment] )
+        rules += environment
+        self.rules_fertility = mask_rule( buffer[rules:rules + fertility] )
+        self.use_extended_neighbors = bool(extended)
+        self.size = size
+        self.buffer = buffer
+        self.offset = offset + SNAPSHOT.size + _padded_(environment + fertility)
+
+    @property
+    def bits(self):
+        """ Returns the packed bits of the cells alive."""
+        return numpy.frombuffer( self.buffer, dtype=numpy.uint8,
+                                 count=( self.size + 7 ) // 8, offset=self.offset )
+
+    def ids(self):
+        """ Returns the sorted ids of the cells alive."""
+        alive = numpy.unpackbits(self.bits, count=self.size, bitorder='little')
+        return numpy.flatnonzero(alive).astype(numpy.int32)
+
+    @property
+    def hue(self):
+        """ Returns the hue of the cells alive, in increasing id order."""
+        offset = self.offset + _padded_( ( self.size + 7 ) // 8 )
+        return numpy.frombuffer( self.buffer, dtype='<u2', count=self.population, offset=offset )
+
+    @property
+    def intensity(self):
+        """ Returns the intensity of the cells alive, in increasing id order."""
+        offset = ( self.offset + _padded_( ( self.size + 7 ) // 8 ) +
+                   _padded_( 2 * self.population ) )
+        return numpy.frombuffer( self.buffer, dtype=numpy.uint8, count=self.population, offset=offset )
+
+    def restore(self, world):
+        """ Set the state of a world of the same radius from the snapshot."""
+        if len(world.topology) != self.size:
+            raise ValueError('snapshot of %d cells, world of %d' % (self.size, len(world.topology)))
+        world.clear()
+        ids = self.ids()
+        world._populate_(ids)
+        world.hue[ids] = self.hue
+        world.intensity[ids] = self.intensity
+        world.cycles = self.cycles
+        world.set_rules( set(self.rules_environment), set(self.rules_fertility) )
+        world.use_extended_neighbors = self.use_extended_neighbors
+        world.extended_neighbors_factor = self.extended_neighbors_factor
+
+class Checkpoint:
+    """ Memory-mapped checkpoint file, a sequence of snapshots."""
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.map_radius = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            raise ValueError('not a checkpoint file: %s' % path)
+        if version != VERSION:
+            raise ValueError('unsupported checkpoint version %d' % version)
+        # number of cells of the map, from its radius
+        self.size = 3 * self.map_radius * (self.map_radius + 1) + 1
+        self.offsets = scan(self.buffer)[0]
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        return Snapshot(self.buffer, self.offsets[index], self.size)
+
+    def load(self, index=-1, engine='set', cache_dir=None, **engine_options):
+        """ Returns a new HexWorld in the state of a snapshot."""
+        world = hexworld.HexWorld(self.map_radius, engine, cache_dir, **engine_options)
+        self[index].restore(world)
+        return world
@@ -0,0 +1,289 @@
+'''
+Unbounded hexagonal world stored in chunks.
+
+The axial plane is cut in square chunks of CHUNK x CHUNK cells, the chunk
+of a cell (q, r) being (q // CHUNK, r // CHUNK). Only the chunks holding
+cells alive are stored, as slots of pooled dense arrays: a chunk is
+allocated when a cell is born in it and freed as soon as it is empty, so
+the memory follows the live pattern instead of a worst-case radius.
+
+At each generation, the chunks alive and the neighbor chunks reached by
+cells on their borders are gathered with a one cell halo, stacked in a
+single padded axial array, and evolved with hexarray.step. Since the
+halo of every chunk holds all the neighbors of its cells, the stacked
+chunks do not interfere with each other.
+
+In axial coordinates, the neighbors of a cell never belong to the chunks
+at (+1, +1) or (-1, -1), so only 6 neighbor chunks are used.
+'''
+
+import random
+import numpy
+import hexu
+import hexarray
+import hexseed
+
+CHUNK = 32
+
+class ChunkedWorld:
+    """ Hexagonal Game of Life on an unbounded map.
+
+        Same rules and colors as HexWorld. The data structures used are:
+          - slots = { key=(cq,cr) : slot } : chunks stored
+          - alive = uint8 array (capacity, CHUNK, CHUNK) : cells alive of
+            each slot, indexed by the cells coordinates within the chunk.
+            Slot 0 is always empty and stands for the missing chunks
+          - hue = int16, intensity = uint8 arrays : colors, same layout
+          - births, deaths = int array (n, 2) : (q, r) of the cells born
+            and dead during the last evolution
+        cells and colors are built from the chunks when read, and replace
+        them when assigned. viewport returns the dense arrays of a region.
+    """
+    def __init__(self, capacity=16):
+        self.rules_environment = { 2, 3 }
+        self.rules_fertility = { 2 }
+        self.use_extended_neighbors = True
+        self.extended_neighbors_factor = 3
+        self.cycles = 0
+        self.slots = {}
+        self.alive = numpy.zeros((capacity, CHUNK, CHUNK), dtype=numpy.uint8)
+        self.hue = numpy.zeros((capacity, CHUNK, CHUNK), dtype=numpy.int16)
+        self.intensity = numpy.zeros((capacity, CHUNK, CHUNK), dtype=numpy.uint8)
+        self.free = list( range(capacity - 1, 0, -1) )
+        self.births = numpy.zeros((0, 2), dtype=numpy.int64)
+        self.deaths = numpy.zeros((0, 2), dtype=numpy.int64)
+
+    def set_rules(self, environement, fertility):
+        self.rules_environment = environement
+        self.rules_fertility = fertility
+
+    def clear(self):
+        self.slots = {}
+        self.alive.fill(0)
+        self.hue.fill(0)
+        self.intensity.fill(0)
+        self.free = list( range(len(self.alive) - 1, 0, -1) )
+        self.cycles = 0
+
+    def __len__(self):
+        """ Returns the number of chunks stored."""
+        return len(self.slots)
+
+    @property
+    def nbytes(self):
+        """ Memory used by the chunks arrays, in bytes."""
+        return self.alive.nbytes + self.hue.nbytes + self.intensity.nbytes
+
+    def _allocate_(self, keys):
+        """ Returns new slots for the given chunk keys, growing the arrays
+            if needed.
+        """
+        while len(self.free) < len(keys):
+            capacity = len(self.alive)
+            for name in ('alive', 'hue', 'intensity'):
+                array = getattr(self, name)
+                grown = numpy.zeros( (2 * capacity,) + array.shape[1:], dtype=array.dtype )
+                grown[:capacity] = array
+                setattr(self, name, grown)
+            self.free.extend( range(2 * capacity - 1, capacity - 1, -1) )
+        slots = [ self.free.pop() for k in keys ]
+        self.slots.update( zip(keys, slots) )
+        return slots
+
+    def _release_(self, keys):
+        """ Free the slots of empty chunks, and shrink the arrays when most
+            of them are unused.
+        """
+        slots = [ self.slots.pop(k) for k in keys ]
+        self.alive[slots] = 0
+        self.hue[slots] = 0
+        self.intensity[slots] = 0
+        self.free.extend(slots)
+        capacity = len(self.alive)
+        if capacity > 16 and 4 * ( len(self.slots) + 1 ) < capacity:
+            self._compact_(capacity // 2)
+
+    def _compact_(self, capacity):
+        keys = list( self.slots.keys() )
+        used = [ self.slots[k] for k in keys ]
+        for name in ('alive', 'hue', 'intensity'):
+            array = getattr(self, name)
+            compact = numpy.zeros( (capacity,) + array.shape[1:], dtype=array.dtype )
+            compact[1:len(used) + 1] = array[used]
+            setattr(self, name, compact)
+        self.slots = dict( zip( keys, range(1, len(used) + 1) ) )
+        self.free = list( range(capacity - 1, len(used), -1) )
+
+    def _set_cells_(self, q, r, hue, intensity):
+        """ Set cells alive with their colors, from arrays of coordinates."""
+        q = numpy.asarray(q, dtype=numpy.int64)
+        r = numpy.asarray(r, dtype=numpy.int64)
+        keys = list( zip( (q // CHUNK).tolist(), (r // CHUNK).tolist() ) )
+        missing = list( set(keys).difference(self.slots) )
+        self._allocate_(missing)
+        slots = numpy.array( [ self.slots[k] for k in keys ], dtype=numpy.intp )
+        self.alive[slots, q % CHUNK, r % CHUNK] = 1
+        self.hue[slots, q % CHUNK, r % CHUNK] = hue
+        self.intensity[slots, q % CHUNK, r % CHUNK] = intensity
+
+    def _alive_coords_(self):
+        """ Returns the (slot, q, r) arrays of the cells alive."""
+        keys = list( self.slots.keys() )
+        used = numpy.array( [ self.slots[k] for k in keys ], dtype=numpy.intp )
+        if len(used) == 0:
+            empty = numpy.zeros(0, dtype=numpy.int64)
+            return empty, empty, empty
+        s, lq, lr = numpy.nonzero(self.alive[used])
+        origin = numpy.array(keys, dtype=numpy.int64).reshape(-1, 2) * CHUNK
+        return used[s], origin[s, 0] + lq, origin[s, 1] + lr
+
+    @property
+    def cells(self):
+        s, q, r = self._alive_coords_()
+        return set( zip( q.tolist(), r.tolist() ) )
+
+    @cells.setter
+    def cells(self, cells):
+        self.clear()
+        cells = list(cells)
+        if cells:
+            q, r = numpy.array(cells, dtype=numpy.int64).T
+            self._set_cells_(q, r, 60, 100)
+
+    @property
+    def colors(self):
+        s, q, r = self._alive_coords_()
+        lq = q % CHUNK
+        lr = r % CHUNK
+        return dict( zip( zip( q.tolist(), r.tolist() ),
+                          zip( self.hue[s, lq, lr].tolist(), self.intensity[s, lq, lr].tolist() ) ) )
+
+    @colors.setter
+    def colors(self, colors):
+        """ Replace the colors of the cells alive. Colors of dead cells
+            are ignored.
+        """
+        for (q, r), (hue, intensity) in colors.items():
+            slot = self.slots.get( (q // CHUNK, r // CHUNK) )
+            if slot is not None and self.alive[slot, q % CHUNK, r % CHUNK]:
+                self.hue[slot, q % CHUNK, r % CHUNK] = hue
+                self.intensity[slot, q % CHUNK, r % CHUNK] = intensity
+
+    def random(self, density, initial_radius, rng=None):
+        """ Seeds the cells within initial_radius of the origin, like
+            HexWorld.random.
+        """
+        self.clear()
+        if rng is not None:
+            rng = hexseed.generator(rng)
+            cells = hexseed.select( hexseed.hexagon(initial_radius), density, rng )
+            if len(cells):
+                self._set_cells_( cells[:, 0], cells[:, 1], hexseed.hues(len(cells), rng), 100 )
+            return
+        potential_cells = hexu.hexagonal_map(initial_radius)
+        selected = random.sample( range(0, len(potential_cells)),
+                                  k = int( density * len(potential_cells) ) )
+        if selected:
+            hue = [ random.choice( [60, 60, 60, 60, 180, 300] ) for c in selected ]
+            q, r = potential_cells[selected].astype(numpy.int64).T
+            self._set_cells_(q, r, hue, 100)
+
+    def viewport(self, q, r, width, height):
+        """ Returns the (alive, hue, intensity) arrays of shape (width,
+            height) of the region starting at the axial coordinates (q, r).
+        """
+        alive = numpy.zeros((width, height), dtype=numpy.uint8)
+        hue = numpy.zeros((width, height), dtype=numpy.int16)
+        intensity = numpy.zeros((width, height), dtype=numpy.uint8)
+        for cq in range(q // CHUNK, (q + width - 1) // CHUNK + 1):
+            for cr in range(r // CHUNK, (r + height - 1) // CHUNK + 1):
+                slot = self.slots.get( (cq, cr) )
+                if slot is None:
+                    continue
+                # intersection of the chunk and the region
+                q0 = max(q, cq * CHUNK)
+                q1 = min(q + width, (cq + 1) * CHUNK)
+                r0 = max(r, cr * CHUNK)
+                r1 = min(r + height, (cr + 1) * CHUNK)
+                source = ( slot, slice(q0 - cq * CHUNK, q1 - cq * CHUNK),
+                                 slice(r0 - cr * CHUNK, r1 - cr * CHUNK) )
+                target = ( slice(q0 - q, q1 - q), slice(r0 - r, r1 - r) )
+                alive[target] = self.alive[source]
+                hue[target] = self.hue[source]
+                intensity[target] = self.intensity[source]
+        return alive, hue, intensity
+
+    def _candidates_(self):
+        """ Returns the keys of the chunks to evolve: the chunks alive and
+            their neighbors reached by cells alive on their borders.
+        """
+        keys = list( self.slots.keys() )
+        used = numpy.array( [ self.slots[k] for k in keys ], dtype=numpy.intp )
+        a = self.alive[used]
+        reach = { (+1, 0): a[:, -1, :].any(axis=1), (-1, 0): a[:, 0, :].any(axis=1),
+                  (0, +1): a[:, :, -1].any(axis=1), (0, -1): a[:, :, 0].any(axis=1),
+                  (+1, -1): a[:, -1, 0] > 0, (-1, +1): a[:, 0, -1] > 0 }
+        candidates = set(keys)
+        for (dq, dr), border in reach.items():
+            for i in numpy.flatnonzero(border).tolist():
+                candidates.add( (keys[i][0] + dq, keys[i][1] + dr) )
+        return list(candidates)
+
+    def _gather_(self, array, keys):
+        """ Returns the padded arrays (n, CHUNK+2, CHUNK+2) of the chunks
+            with their one cell halo.
+        """
+        def slots(dq, dr):
+            return numpy.array( [ self.slots.get( (cq + dq, cr + dr), 0 ) for cq, cr in keys ],
+                                dtype=numpy.intp )
+        padded = numpy.zeros( (len(keys), CHUNK + 2, CHUNK + 2), dtype=array.dtype )
+        padded[:, 1:-1, 1:-1] = array[ slots(0, 0) ]
+        padded[:, 0, 1:-1] = array[ slots(-1, 0), -1, : ]
+        padded[:, -1, 1:-1] = array[ slots(+1, 0), 0, : ]
+        padded[:, 1:-1, 0] = array[ slots(0, -1), :, -1 ]
+        padded[:, 1:-1, -1] = array[ slots(0, +1), :, 0 ]
+        padded[:, -1, 0] = array[ slots(+1, -1), 0, -1 ]
+        padded[:, 0, -1] = array[ slots(-1, +1), -1, 0 ]
+        return padded
+
+    def evolve(self):
+        keys = self._candidates_()
+        n = len(keys)
+        if n == 0:
+            # extinct world
+            self.births = numpy.zeros((0, 2), dtype=numpy.int64)
+            self.deaths = numpy.zeros((0, 2), dtype=numpy.int64)
+            self.cycles += 1
+            return
+        shape = (n * (CHUNK + 2), CHUNK + 2)
+        alive = self._gather_(self.alive, keys)
+        hue = self._gather_(self.hue, keys)
+        intensity = self._gather_(self.intensity, keys)
+        mask = numpy.zeros((n, CHUNK + 2, CHUNK + 2), dtype=bool)
+        mask[:, 1:-1, 1:-1] = True
+
+        survive, born = hexarray.rule_tables(self)
+        next_alive, next_hue, next_intensity = hexarray.step( alive.reshape(shape),
+                hue.reshape(shape), intensity.reshape(shape), mask.reshape(shape),
+                survive, born, hexarray.extended_factor(self) )
+        inner = ( slice(None), slice(1, -1), slice(1, -1) )
+        next_alive = next_alive.reshape(alive.shape)[inner]
+        next_hue = next_hue.reshape(alive.shape)[inner]
+        next_intensity = next_intensity.reshape(alive.shape)[inner]
+
+        origin = numpy.array(keys, dtype=numpy.int64).reshape(-1, 2) * CHUNK
+        previous = alive[inner]
+        s, lq, lr = numpy.nonzero(next_alive > previous)
+        self.births = numpy.stack( (origin[s, 0] + lq, origin[s, 1] + lr), axis=1 )
+        s, lq, lr = numpy.nonzero(next_alive < previous)
+        self.deaths = numpy.stack( (origin[s, 0] + lq, origin[s, 1] + lr), axis=1 )
+
+        nonempty = next_alive.reshape(n, -1).any(axis=1)
+        self._allocate_( [ k for k, e in zip(keys, nonempty.tolist()) if e and k not in self.slots ] )
+        self._release_( [ k for k, e in zip(keys, nonempty.tolist()) if not e and k in self.slots ] )
+        stored = numpy.flatnonzero(nonempty)
+        slots = numpy.array( [ self.slots[keys[i]] for i in stored.tolist() ], dtype=numpy.intp )
+        self.alive[slots] = next_alive[stored]
+        self.hue[slots] = next_hue[stored]
+        self.intensity[slots] = next_intensity[stored]
+        self.cycles += 1
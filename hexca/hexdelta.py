@@ -0,0 +1,148 @@
+'''
+Delta driven engine for the hexagonal game of life.
+
+The number of alive direct neighbors of every cell is kept from one
+generation to the next, and only updated with the cells born and dead
+during the previous generation. Since the next state of a cell only
+depends on its own state and on this count, a cell whose state and count
+did not change keeps doing what it did: only the cells born or dead and
+their neighbors are evaluated.
+
+The extended neighbors term is derived from the direct count, so no other
+count needs to be maintained.
+
+The world cells are updated in place and the world colors arrays only
+for the cells changed, and the intensities are only faded for the young
+cells (intensity above 25),
+so the cost of a generation follows the activity of the world instead of
+its population.
+'''
+
+import numpy
+import hexarray
+
+class DeltaEngine:
+    """ Evolves the cells of an HexWorld by applying the changes of the
+        previous generation to persistent neighbors counts.
+
+        The data structures used are indexed by cell id, with an extra
+        entry standing for the neighbors outside of the map:
+          - alive = uint8 array : cells alive
+          - count = int8 array : number of alive direct neighbors
+          - hue, intensity = int16 arrays : colors of the cells alive
+          - young = array( id, ... ) : cells alive still fading
+          - pending = array( id, ... ) : cells to evaluate at next cycle
+          - position = int array : scratch array of _around_
+    """
+    def __init__(self, world):
+        self.world = world
+        self.size = len(world.topology)
+        self.neighbors = world.topology.direct_table(self.size)
+        self.alive = numpy.zeros(self.size + 1, dtype=numpy.uint8)
+        self.count = numpy.zeros(self.size + 1, dtype=numpy.int8)
+        self.hue = numpy.zeros(self.size + 1, dtype=numpy.int16)
+        self.intensity = numpy.zeros(self.size + 1, dtype=numpy.int16)
+        self.young = numpy.zeros(0, dtype=numpy.int32)
+        self.pending = numpy.zeros(0, dtype=numpy.int32)
+        self.position = numpy.zeros(self.size + 1, dtype=numpy.intp)
+        self.rules = None
+        self.published = None
+
+    def _around_(self, ids):
+        """ Returns the ids of the given cells and of their direct
+            neighbors, each once, in no particular order.
+        """
+        around = numpy.concatenate( ( ids, self.neighbors[ids].ravel() ) )
+        # among the repeated ids, only the one whose position was written
+        # last is kept, without sorting nor scanning the whole map
+        position = numpy.arange(len(around))
+        self.position[around] = position
+        around = around[ self.position[around] == position ]
+        return around[ around < self.size ]
+
+    def load(self):
+        """ Rebuild the state from the world cells and colors."""
+        world = self.world
+        ids = world.topology.cells_ids(world.cells)
+        self.alive.fill(0)
+        self.alive[ids] = 1
+        self.count[:] = numpy.bincount( self.neighbors[ids].ravel(),
+                                        minlength=self.size + 1 )
+        self.count[self.size] = 0
+        self.hue.fill(0)
+        self.intensity.fill(0)
+        self.hue[ids] = world.hue[ids]
+        self.intensity[ids] = world.intensity[ids]
+        self.young = ids[ self.intensity[ids] > 25 ]
+        self.pending = self._around_(ids)
+        self.published = world.cells
+
+    def _check_rules_(self):
+        """ Returns the rules lookup tables, and evaluate every candidate
+            cell if they have been modified.
+        """
+        world = self.world
+        survive, born = hexarray.rule_tables(world)
+        factor = hexarray.extended_factor(world)
+        rules = ( survive.tobytes(), born.tobytes(), factor )
+        if rules != self.rules:
+            self.rules = rules
+            self.pending = self._around_( numpy.flatnonzero(self.alive[:self.size]) )
+        return survive, born, factor
+
+    def evolve(self):
+        world = self.world
+        if world.cells is not self.published:
+            self.load()
+        metrics = world.metrics
+        if metrics is not None:
+            metrics.mark('rebuild')
+        survive, born, factor = self._check_rules_()
+
+        candidates = self.pending
+        count = self.count[candidates].astype(numpy.intp)
+        if factor:
+            count += count // factor
+        was_alive = self.alive[candidates] == 1
+        births = candidates[ ~was_alive & born[count] ]
+        deaths = candidates[ was_alive & ~survive[count] ]
+        if metrics is not None:
+            metrics.mark('count')
+
+        # newborn colors, from the parents of the previous generation
+        birth_hue = hexarray.parents_hue(self.alive, self.hue, self.neighbors[births])
+        young = self.young[ self.alive[self.young] == 1 ]
+        young = young[ ~numpy.isin(young, deaths) ]
+        self.intensity[young] = hexarray.fade( self.intensity[young] )
+        self.hue[births] = birth_hue
+        self.intensity[births] = 100
+        self.hue[deaths] = 0
+        self.intensity[deaths] = 0
+        self.young = numpy.concatenate( ( young[ self.intensity[young] > 25 ], births ) )
+        if metrics is not None:
+            metrics.mark('color')
+
+        self.alive[births] = 1
+        self.alive[deaths] = 0
+        # the k-th neighbors of distinct cells are distinct
+        for k in range(0, 6):
+            self.count[ self.neighbors[births, k] ] += 1
+            self.count[ self.neighbors[deaths, k] ] -= 1
+        self.count[self.size] = 0
+        self.pending = self._around_( numpy.concatenate( (births, deaths) ) )
+
+        # publish the changes in place
+        topology = world.topology
+        born_cells = topology.cell_coords(births)
+        dead_cells = topology.cell_coords(deaths)
+        world.cells.difference_update(dead_cells)
+        world.cells.update(born_cells)
+        if metrics is not None:
+            metrics.mark('rebuild')
+        for ids in ( deaths, young, births ):
+            world.hue[ids] = self.hue[ids]
+            world.intensity[ids] = self.intensity[ids]
+        if metrics is not None:
+            metrics.mark('color')
+        world.births = births
+        world.deaths = deaths
@@ -0,0 +1,101 @@
+'''
+Ensemble of independent hexagonal worlds evolved together.
+
+Exploring rules means running many small worlds with different seeds and
+rules. Instead of paying the Python overhead and the neighbors index of
+each HexWorld, an HexEnsemble holds B worlds of the same radius in a
+single (B, cells) array sharing one hextopo.HexTopology, and evolves all
+of them with a few array operations per generation.
+
+The rules of each world are stored as rows of boolean lookup tables
+indexed by the neighbors count, so every world can have its own rules
+and extended neighbors factor. Colors are not tracked.
+'''
+
+import numpy
+import hextopo
+import hexarray
+
+# Largest neighbors count: 6 direct neighbors plus an extended term of 6
+MAX_COUNT = 12
+
+class HexEnsemble:
+    """ B hexagonal worlds of the same radius evolved at once.
+
+        The data structures used are:
+          - alive = uint8 array (B, cells + 1) : cells alive in each world,
+            indexed by the topology cell ids. The last column is always
+            zero and stands for the neighbors outside of the map
+          - neighbors = int32 array (cells, 6) : direct neighbors ids
+          - survive, born = bool arrays (B, MAX_COUNT + 1) : rules of each
+            world as lookup tables indexed by the neighbors count
+          - factors = int array (B) : extended neighbors factor of each
+            world, 0 when the extended neighbors are not used
+    """
+    def __init__(self, map_radius, size, cache_dir=None):
+        self.map_radius = map_radius
+        self.topology = hextopo.load(map_radius, cache_dir)
+        cells = len(self.topology)
+        self.neighbors = self.topology.direct_table(cells)
+        self.alive = numpy.zeros((size, cells + 1), dtype=numpy.uint8)
+        self.survive = numpy.zeros((size, MAX_COUNT + 1), dtype=bool)
+        self.born = numpy.zeros((size, MAX_COUNT + 1), dtype=bool)
+        self.factors = numpy.zeros(size, dtype=numpy.uint8)
+        self.cycles = 0
+        # same default rules as HexWorld
+        for i in range(0, size):
+            self.set_rules(i, {2, 3}, {2}, 3)
+
+    def __len__(self):
+        return len(self.alive)
+
+    def set_rules(self, index, environment, fertility, extended_neighbors_factor=0):
+        """ Set the rules of a world (an index, a slice or an array of
+            indices). A factor of 0 disables the extended neighbors.
+        """
+        self.survive[index] = hexarray.rule_table(environment, MAX_COUNT + 1)
+        born = hexarray.rule_table(fertility, MAX_COUNT + 1)
+        # a cell without any living neighbor is never born
+        born[0] = False
+        self.born[index] = born
+        self.factors[index] = extended_neighbors_factor
+
+    def clear(self):
+        self.alive.fill(0)
+        self.cycles = 0
+
+    def random(self, density, initial_radius, seed=None):
+        """ Seeds every world with its own random draw of the cells within
+            initial_radius, each cell being alive with probability density.
+        """
+        if initial_radius >= self.map_radius:
+            raise ValueError('initial_radius is larger than map_radius')
+        self.clear()
+        rng = numpy.random.default_rng(seed)
+        coords = self.topology.coords
+        inside = numpy.maximum( numpy.maximum( abs(coords[:, 0]), abs(coords[:, 1]) ),
+                                abs(coords[:, 0] + coords[:, 1]) ) <= initial_radius
+        draw = rng.random( (len(self), int( inside.sum() )) ) < density
+        self.alive[:, numpy.flatnonzero(inside)] = draw
+
+    def evolve(self):
+        alive = self.alive
+        cells = alive.shape[1] - 1
+        count = numpy.zeros((len(alive), cells), dtype=numpy.uint8)
+        for k in range(0, 6):
+            count += alive[:, self.neighbors[:, k]]
+        factors = self.factors[:, numpy.newaxis]
+        count += numpy.where( factors > 0, count // numpy.maximum(factors, 1), 0 ).astype(numpy.uint8)
+        was_alive = alive[:, :cells].astype(bool)
+        survivors = was_alive & numpy.take_along_axis(self.survive, count, axis=1)
+        births = ~was_alive & numpy.take_along_axis(self.born, count, axis=1)
+        alive[:, :cells] = survivors | births
+        self.cycles += 1
+
+    def population(self):
+        """ Returns the number of cells alive in each world."""
+        return self.alive.sum(axis=1, dtype=numpy.int64)
+
+    def cells(self, index):
+        """ Returns the cells alive in a world, as a set of (q, r)."""
+        return set( self.topology.cell_coords( numpy.flatnonzero(self.alive[index, :-1]) ) )
@@ -1,12 +1,17 @@
-import math
 import pygame
 import collections
+import time
 import hexu
-import hexworld
+import hexmap
+import hexrunner
 
 # Define the radius of a cell
 hex_radius = 10
 
+# Generations evolved per step when fast-forwarding, only the last one
+# being drawn
+FAST_FORWARD = 1000
+
 WHITE = (255, 255, 255)
 BLACK = (  0,   0,   0)
 RED   = (255,   0,   0)
@@ -14,61 +19,6 @@ GREEN = (  0, 255,   0)
 BLUE  = (  0,   0, 255)
 YELLOW = ( 255, 255, 0)
 
-class HexMap(hexworld.HexWorld):
-    
-    def __init__(self, map_radius, hex_radius, screen_size):
-        super(HexMap, self).__init__(map_radius)
-        self.map_radius = map_radius
-        self.hex_radius = hex_radius
-        self.screen_size = screen_size
-        self.screen_center = tuple(d // 2 for d in screen_size)
-        self.grid_size = hexu.map_px_size(map_radius, hex_radius)
-        self.grid_offset = ( 0.5 * ( screen_size[0] - self.grid_size[0] ),
-                0.5 * ( screen_size[1] - self.grid_size[1] ) )
-        
-        self.coords_map = self._build_grid_coordinates_(self.screen_center)
-        self.grid_overlay = self._draw_base_grid_(self.coords_map)        
-        
-    def _build_grid_coordinates_(self, offset):
-        coords = {}
-        for h in hexu.hexagonal_map_gen(self.map_radius):
-            center = hexu.cell_center(h)
-            corners = []
-            for i in range(0, 6):
-                a = math.radians(60*i+30)
-                x = round( self.hex_radius * (center[0] + math.cos(a)) + offset[0] )
-                y = round( self.hex_radius * (center[1] + math.sin(a)) + offset[1] )
-                corners.append( (int(x), int(y)) )
-            coords[h] = corners
-        return coords
-
-    def _draw_base_grid_(self, coords):
-        grid = pygame.Surface(self.grid_size, depth=32)
-        grid.fill(WHITE)
-        grid.set_colorkey(WHITE)
-        for cell, points in coords.items():
-            # Corner points are pre-computed in screen build_grid_coordinates
-            # for optimal speed when drawing individual cells
-            # Since the grid overlay is only a subset of the screen, it is
-            # necessary to remove this offset
-            local_points = []
-            for p in points:
-                local_points.append( tuple((p[0]-self.grid_offset[0],
-                                            p[1]-self.grid_offset[1]) ) )
-            pygame.draw.lines(grid, BLUE, True, local_points)
-        return grid
-
-    def overlay_grid(self, screen):
-        screen.blit(self.grid_overlay, self.grid_offset)
-
-
-    def draw_cells(self, screen):
-        color = pygame.Color(255, 255, 0)
-        for c in self.cells:
-            points = self.coords_map[c]
-            color.hsva = (self.colors[c][0], self.colors[c][1], 100, 100)
-            pygame.draw.polygon(screen, color, points)
-
 # Initialize Pygame
 pygame.init()
 
@@ -81,7 +31,11 @@ screen_size = modes[-1]
 
 map_radius = hexu.max_map_radius(hex_radius, screen_size[1]-8)
 
-hmap = HexMap(map_radius, hex_radius, screen_size)
+hmap = hexmap.HexMap(map_radius, hex_radius, screen_size)
+# The activity engine shows the activity of the tiles of the map as a
+# heatmap, see hexactivity
+#hmap = hexmap.HexMap(map_radius, hex_radius, screen_size, engine='activity')
+hmap.track_cycles()
                 
 # Create the drawing surface
 screen = pygame.display.set_mode(screen_size, 
@@ -112,12 +66,20 @@ print('Number of Cells = %d' % len(hmap))
 hmap.random(0.5, int(0.75*hmap.map_radius))
 #hmap.cluster(4, 10, 0.5)
 
-counter = 0
-skip = 2
 randradius = collections.deque([0.5, 0.75, 0.25])
 
-active = False
-one_cycle = False
+# The world evolves in a background thread, paused at first, and every
+# modification of the world is sent to it with runner.call
+runner = hexrunner.HexRunner(hmap, rate=5)
+runner.start()
+snapshot = runner.latest()
+
+# Only redraw the cells changed, see HexMap.draw_changes
+draw_changes = False
+# Overlay of the activity of the tiles with the activity engine, see
+# HexMap.draw_activity
+draw_activity = False
+text_rects = []
 
 font_size = int( screen_size[1] / 36 )
 font = pygame.font.Font(None, font_size)
@@ -127,10 +89,15 @@ legend.append( font.render("quit: ESC", 1, GREEN) )
 legend.append( font.render("cluster map: c", 1, GREEN) )
 legend.append( font.render("random radius: a", 1, GREEN) )
 legend.append( font.render("random: e / r / t", 1, GREEN) )
-legend.append( font.render("speed: s / d / f", 1, GREEN) )
+legend.append( font.render("speed: s / d / f / g", 1, GREEN) )
+legend.append( font.render("toggle fast-forward: j", 1, GREEN) )
 legend.append( font.render("run/pause: SPACEBAR", 1, GREEN) )
 legend.append( font.render("step one cycle (next): n", 1, GREEN) )
 legend.append( font.render("toggle use extended neighbors: x", 1, GREEN) )
+legend.append( font.render("toggle redraw changes only: m", 1, GREEN) )
+legend.append( font.render("toggle metrics: i", 1, GREEN) )
+if hasattr(hmap.engine, 'cells_activity'):
+    legend.append( font.render("toggle activity heatmap: h", 1, GREEN) )
 legend.append( font.render("environment rule: {1,2,3,4,5,6}", 1, GREEN) )
 legend.append( font.render("fertility rule: SHIFT+{1,2,3,4,5,6}", 1, GREEN) )
 
@@ -140,6 +107,18 @@ def toggle_rule(rule, key):
     else:
         rule.add(key)
 
+def toggle_extended_neighbors(world):
+    world.use_extended_neighbors = not world.use_extended_neighbors
+
+def toggle_metrics(world):
+    if world.metrics is None:
+        world.instrument()
+    else:
+        world.metrics = None
+
+def format_ms(value):
+    return '-' if value is None else '{0:0.2f}'.format(value)
+
 # Main event loop
 while not done:
     for event in pygame.event.get(): 
@@ -149,118 +128,174 @@ while not done:
             if event.key == pygame.K_ESCAPE:
                 done = True
             elif event.key == pygame.K_SPACE:
-                active = not active
+                runner.active = not runner.active
             elif event.key == pygame.K_n:
-                if not active:
-                    one_cycle = True
+                if not runner.active:
+                    runner.step()
             elif event.key == pygame.K_s:
-                skip = 5
+                runner.rate = 2
             elif event.key == pygame.K_d:
-                skip = 2
+                runner.rate = 5
             elif event.key == pygame.K_f:
-                skip = 1
+                runner.rate = 10
+            elif event.key == pygame.K_g:
+                runner.rate = None
+            elif event.key == pygame.K_j:
+                runner.generations = 1 if runner.generations > 1 else FAST_FORWARD
             elif event.key == pygame.K_c:
-                hmap.cluster(9, 9, 0.4)
+                runner.call(hmap.cluster, 9, 9, 0.4)
             elif event.key == pygame.K_a:
                 randradius.rotate()
             elif event.key == pygame.K_e:
-                hmap.random(0.2, int(randradius[0]*hmap.map_radius))
+                runner.call(hmap.random, 0.2, int(randradius[0]*hmap.map_radius))
             elif event.key == pygame.K_r:
-                hmap.random(0.5, int(randradius[0]*hmap.map_radius))
+                runner.call(hmap.random, 0.5, int(randradius[0]*hmap.map_radius))
             elif event.key == pygame.K_t:
-                hmap.random(0.8, int(randradius[0]*hmap.map_radius))
+                runner.call(hmap.random, 0.8, int(randradius[0]*hmap.map_radius))
             elif event.key == pygame.K_x:
-                hmap.use_extended_neighbors = not hmap.use_extended_neighbors
+                runner.call(toggle_extended_neighbors, hmap)
+            elif event.key == pygame.K_m:
+                draw_changes = not draw_changes
+                hmap.renderer.invalidate()
+            elif event.key == pygame.K_i:
+                runner.call(toggle_metrics, hmap)
+            elif event.key == pygame.K_h and hasattr(hmap.engine, 'cells_activity'):
+                draw_activity = not draw_activity
+                hmap.renderer.invalidate()
             elif (pygame.key.get_mods() & pygame.KMOD_SHIFT):
                 if event.key == pygame.K_1:
-                    toggle_rule(hmap.rules_fertility, 1)
+                    runner.call(toggle_rule, hmap.rules_fertility, 1)
                 elif event.key == pygame.K_2:
-                    toggle_rule(hmap.rules_fertility, 2)
+                    runner.call(toggle_rule, hmap.rules_fertility, 2)
                 elif event.key == pygame.K_3:
-                    toggle_rule(hmap.rules_fertility, 3)
+                    runner.call(toggle_rule, hmap.rules_fertility, 3)
                 elif event.key == pygame.K_4 :
-                    toggle_rule(hmap.rules_fertility, 4)
+                    runner.call(toggle_rule, hmap.rules_fertility, 4)
                 elif event.key == pygame.K_5:
-                    toggle_rule(hmap.rules_fertility, 5)
+                    runner.call(toggle_rule, hmap.rules_fertility, 5)
                 elif event.key == pygame.K_6:
-                    toggle_rule(hmap.rules_fertility, 6)
+                    runner.call(toggle_rule, hmap.rules_fertility, 6)
                 elif event.key == pygame.K_7:
-                    toggle_rule(hmap.rules_fertility, 7)
+                    runner.call(toggle_rule, hmap.rules_fertility, 7)
                 elif event.key == pygame.K_8:
-                    toggle_rule(hmap.rules_fertility, 8 )
+                    runner.call(toggle_rule, hmap.rules_fertility, 8 )
                 elif event.key == pygame.K_9:
-                    toggle_rule(hmap.rules_fertility, 9 )                    
+                    runner.call(toggle_rule, hmap.rules_fertility, 9 )                    
             elif event.key == pygame.K_1:
-                toggle_rule(hmap.rules_environment, 1)
+                runner.call(toggle_rule, hmap.rules_environment, 1)
             elif event.key == pygame.K_2:
-                toggle_rule(hmap.rules_environment, 2)
+                runner.call(toggle_rule, hmap.rules_environment, 2)
             elif event.key == pygame.K_3:
-                toggle_rule(hmap.rules_environment, 3)
+                runner.call(toggle_rule, hmap.rules_environment, 3)
             elif event.key == pygame.K_4:
-                toggle_rule(hmap.rules_environment, 4)
+                runner.call(toggle_rule, hmap.rules_environment, 4)
             elif event.key == pygame.K_5:
-                toggle_rule(hmap.rules_environment, 5)
+                runner.call(toggle_rule, hmap.rules_environment, 5)
             elif event.key == pygame.K_6:
-                toggle_rule(hmap.rules_environment, 6)
+                runner.call(toggle_rule, hmap.rules_environment, 6)
             elif event.key == pygame.K_7:
-                toggle_rule(hmap.rules_environment, 7)
+                runner.call(toggle_rule, hmap.rules_environment, 7)
             elif event.key == pygame.K_8:
-                toggle_rule(hmap.rules_environment, 8)
+                runner.call(toggle_rule, hmap.rules_environment, 8)
             elif event.key == pygame.K_9:
-                toggle_rule(hmap.rules_environment, 9)
+                runner.call(toggle_rule, hmap.rules_environment, 9)
 
-    # Clear the screen
-    screen.fill(BLACK)
-    
-    # Draw living cells
-    hmap.draw_cells(screen)
-    
-    # Apply the stored grid
-    hmap.overlay_grid(screen)
+    # Draw the latest state published by the evolution thread
+    snapshot = runner.latest() or snapshot
+
+    render_start = time.perf_counter()
+    if draw_changes:
+        # Erase the previous texts, and redraw the whole map if they
+        # were covering a part of it
+        for r in text_rects:
+            screen.fill(BLACK, r)
+            if r.colliderect(hmap.renderer.rect):
+                hmap.renderer.invalidate()
+        rects = hmap.draw_changes(screen, snapshot) + text_rects
+        if draw_activity:
+            hmap.draw_activity(screen, snapshot)
+            rects.append( hmap.renderer.rect.copy() )
+    else:
+        # Clear the screen
+        screen.fill(BLACK)
+
+        # Draw living cells
+        hmap.draw_cells(screen, snapshot)
+        if draw_activity:
+            hmap.draw_activity(screen, snapshot)
+
+        # Apply the stored grid
+        hmap.overlay_grid(screen)
+    metrics = hmap.metrics
+    if metrics is not None:
+        metrics.render( time.perf_counter() - render_start )
+    text_rects = []
     
     fps = clock.get_fps()
     text = font.render("fps: {0:0.1f}".format(fps), 1, GREEN)
-    screen.blit(text, (screen_size[0]-160, 20))
+    text_rects.append( screen.blit(text, (screen_size[0]-200, 20)) )
+    text = font.render("generations/s: {0:d}".format(runner.generations_per_second()), 1, GREEN)
+    text_rects.append( screen.blit(text, (screen_size[0]-200, 20 + font_size)) )
+    summary = metrics.summary() if metrics is not None else None
+    if summary is not None:
+        # means over the last generations
+        lines = [ "population: {0:0.0f}".format(summary.population),
+                  "births / deaths: {0:0.0f} / {1:0.0f}".format(summary.births, summary.deaths),
+                  "candidates: " + ( '-' if summary.candidates is None
+                                     else "{0:0.0f}".format(summary.candidates) ),
+                  "count ms: " + format_ms(summary.count_ms),
+                  "color ms: " + format_ms(summary.color_ms),
+                  "rebuild ms: " + format_ms(summary.rebuild_ms),
+                  "evolve ms: " + format_ms(summary.evolve_ms),
+                  "render ms: " + format_ms(summary.render_ms) ]
+        y = 20 + 2 * font_size
+        for line in lines:
+            text = font.render(line, 1, GREEN)
+            text_rects.append( screen.blit(text, (screen_size[0]-200, y)) )
+            y += font_size
     
     info = []
     info.append( font.render("map radius = {0:d}".format(hmap.map_radius), 1, GREEN) )
     info.append( font.render("number of cells = {0:d}".format(len(hmap)), 1, GREEN) )
-    info.append( font.render("number of cycles = {0:d}".format(hmap.cycles), 1, GREEN) )
-    info.append( font.render("use extended neighbors = {0}".format(hmap.use_extended_neighbors), 1, GREEN) )
-    info.append( font.render("environment rule = {0:s}".format(str(hmap.rules_environment)), 1, GREEN) )
-    info.append( font.render("fertility rule = {0:s}".format(str(hmap.rules_fertility)), 1, GREEN) )
-    if not active:
+    info.append( font.render("number of cycles = {0:d}".format(snapshot.cycles), 1, GREEN) )
+    info.append( font.render("use extended neighbors = {0}".format(snapshot.use_extended_neighbors), 1, GREEN) )
+    info.append( font.render("environment rule = {0:s}".format(str(snapshot.rules_environment)), 1, GREEN) )
+    info.append( font.render("fertility rule = {0:s}".format(str(snapshot.rules_fertility)), 1, GREEN) )
+    cell = hmap.cell_at( pygame.mouse.get_pos() )
+    if cell is not None:
+        info.append( font.render("cell under the mouse = ({0:d}, {1:d})".format(*cell), 1, GREEN) )
+    if snapshot.period is not None:
+        info.append( font.render("period {0:d} since cycle {1:d}".format(*snapshot.period), 1, GREEN) )
+    if not runner.active:
         speed = 'paused'
+    elif runner.rate is None:
+        speed = 'speed = unlimited'
     else:
-        speed = "speed = {0:d}%".format( int( 1.0/skip*100.0 ) )
+        speed = "speed = {0:d} generations/s".format(runner.rate)
     info.append( font.render(speed, 1, GREEN) )
+    if runner.generations > 1:
+        info.append( font.render("fast-forward = {0:d} generations/step".format(runner.generations), 1, GREEN) )
     
     y = 20
     for i in info:
-        screen.blit(i, (20, y))
+        text_rects.append( screen.blit(i, (20, y)) )
         y += font_size
         
     y = screen_size[1]-60
     for t in legend[::-1]:
-        screen.blit(t, (20, y))
+        text_rects.append( screen.blit(t, (20, y)) )
         y -= font_size
 
     # Go ahead and update the screen with what we've drawn.
-    pygame.display.flip()
-    
-    # Evolve
-    if active:
-        if (counter % skip) == 0:
-            hmap.evolve()
-        counter += 1
+    if draw_changes:
+        pygame.display.update(rects + text_rects)
     else:
-        if one_cycle:
-            hmap.evolve()
-            one_cycle = False
-            
-    # Limit to 60 frames per second
-    clock.tick(10)
+        pygame.display.flip()
+    
+    # Limit to 30 frames per second, the evolution runs at its own pace
+    clock.tick(30)
 
 # Exit
+runner.stop()
 pygame.quit()
 print('Done.')
@@ -0,0 +1,57 @@
+'''
+Detection of periodic worlds with Zobrist hashing.
+
+Every cell id gets a random 64 bits key, and the hash of a world is the
+xor of the keys of its cells alive. Since xor is its own inverse, the hash
+of the next generation is obtained by xoring the keys of the cells born
+and dead only, at a cost proportional to the activity of the world
+instead of its population.
+
+The hashes of the recent generations are kept in a bounded history: when
+a hash comes back, the world entered a cycle (still life or oscillator).
+'''
+
+import collections
+import numpy
+
+class CycleDetector:
+    """ Zobrist hash of a world and history of its recent values.
+
+        Once a cycle is found, period holds its length in generations and
+        start the generation at which the world entered it.
+    """
+    def __init__(self, size, history=256, seed=0x5eed):
+        rng = numpy.random.default_rng(seed)
+        self.keys = rng.integers(0, 2**64 - 1, size=size, dtype=numpy.uint64, endpoint=True)
+        self.history_size = history
+        self.reset( numpy.zeros(0, dtype=numpy.int32), 0 )
+
+    def _xor_(self, ids):
+        return int( numpy.bitwise_xor.reduce(self.keys[ids]) ) if len(ids) else 0
+
+    def reset(self, ids, generation):
+        """ Compute the hash of a new world from the ids of its cells."""
+        self.value = self._xor_(ids)
+        self.history = collections.OrderedDict()
+        self.period = None
+        self.start = None
+        self.record(generation)
+
+    def update(self, births, deaths, generation):
+        """ Update the hash with the ids of the cells born and dead, and
+            record it as the hash of the given generation.
+        """
+        self.value ^= self._xor_(births) ^ self._xor_(deaths)
+        self.record(generation)
+
+    def record(self, generation):
+        if self.period is not None:
+            return
+        seen = self.history.get(self.value)
+        if seen is not None:
+            self.period = generation - seen
+            self.start = seen
+        else:
+            self.history[self.value] = generation
+            if len(self.history) > self.history_size:
+                self.history.popitem(last=False)
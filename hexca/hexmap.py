@@ -0,0 +1,100 @@
+'''
+Pygame rendering of an HexWorld.
+
+HexMap only needs pygame surfaces, never the display: it is used by the
+interactive hexgame.py as well as by the headless hexrecord.py.
+'''
+
+import numpy
+import pygame
+import hexu
+import hexworld
+import hexraster
+
+WHITE = (255, 255, 255)
+BLACK = (  0,   0,   0)
+BLUE  = (  0,   0, 255)
+
+class HexMap(hexworld.HexWorld):
+    
+    def __init__(self, map_radius, hex_radius, screen_size, engine='set',
+                 cache_dir=None, **engine_options):
+        super(HexMap, self).__init__(map_radius, engine, cache_dir, **engine_options)
+        self.map_radius = map_radius
+        self.hex_radius = hex_radius
+        self.screen_size = screen_size
+        self.screen_center = tuple(d // 2 for d in screen_size)
+        self.grid_size = hexu.map_px_size(map_radius, hex_radius)
+        self.grid_offset = ( 0.5 * ( screen_size[0] - self.grid_size[0] ),
+                0.5 * ( screen_size[1] - self.grid_size[1] ) )
+        
+        self.coords_map = self._build_grid_coordinates_(self.screen_center)
+        self.grid_overlay = self._draw_base_grid_(self.coords_map)        
+        self.renderer = hexraster.RasterRenderer(self, self.coords_map, screen_size, BLACK)
+        
+    def _build_grid_coordinates_(self, offset):
+        # Corners of all the cells at once, in the topology order
+        centers = hexu.cells_centers(self.topology.coords)
+        a = numpy.radians( 60 * numpy.arange(6) + 30 )
+        x = numpy.round( self.hex_radius * (centers[:, 0:1] + numpy.cos(a)) + offset[0] )
+        y = numpy.round( self.hex_radius * (centers[:, 1:2] + numpy.sin(a)) + offset[1] )
+        corners = [ list( zip(xs, ys) ) for xs, ys in
+                    zip( x.astype(int).tolist(), y.astype(int).tolist() ) ]
+        return dict( zip( self.topology.cell_coords( numpy.arange(len(self.topology)) ),
+                          corners ) )
+
+    def _draw_base_grid_(self, coords):
+        grid = pygame.Surface(self.grid_size, depth=32)
+        grid.fill(WHITE)
+        grid.set_colorkey(WHITE)
+        for cell, points in coords.items():
+            # Corner points are pre-computed in screen build_grid_coordinates
+            # for optimal speed when drawing individual cells
+            # Since the grid overlay is only a subset of the screen, it is
+            # necessary to remove this offset
+            local_points = []
+            for p in points:
+                local_points.append( tuple((p[0]-self.grid_offset[0],
+                                            p[1]-self.grid_offset[1]) ) )
+            pygame.draw.lines(grid, BLUE, True, local_points)
+        return grid
+
+    def cell_at(self, position):
+        """ Returns the cell (q, r) under a screen position, or None
+            outside of the map.
+        """
+        q, r = hexu.pixels_to_cells(position, self.hex_radius, self.screen_center)[0].tolist()
+        if hexu.cells_distance( (q, r), (0, 0) ) > self.map_radius:
+            return None
+        return ( q, r )
+
+    def overlay_grid(self, screen):
+        screen.blit(self.grid_overlay, self.grid_offset)
+
+    def draw_changes(self, screen, state=None):
+        """ Redraw only the cells changed since the last frame, with the
+            grid overlay above them, and returns the rectangles modified.
+        """
+        rects = self.renderer.draw_changes(screen, state)
+        ox = int(self.grid_offset[0])
+        oy = int(self.grid_offset[1])
+        screen.blits( [ ( self.grid_overlay, r, r.move(-ox, -oy) ) for r in rects ],
+                      doreturn=False )
+        return rects
+
+
+    def draw_cells(self, screen, state=None):
+        # The whole map is written, including the background
+        self.renderer.draw(screen, state)
+
+    def draw_activity(self, screen, state=None):
+        """ Overlay the activity of the tiles of the activity engine as a
+            heatmap, over the cells already drawn: the tiles asleep for a
+            while are left untouched, the most active ones are the reddest.
+        """
+        if state is None:
+            activity = self.engine.cells_activity()
+        else:
+            activity = state.activity
+        if activity is not None:
+            self.renderer.draw_heatmap(screen, activity)
@@ -0,0 +1,140 @@
+'''
+Per generation instrumentation of an HexWorld.
+
+Disabled by default, it then costs a single test per generation. Once
+enabled with HexWorld.instrument(), every generation produces a Record
+holding the population, the number of cells born and dead, the number
+of candidate cells of the next generation (potential_population) and the
+time spent in each phase of the evolution:
+  - count: neighbors counting and rules
+  - color: hue and intensity of the cells
+  - rebuild: alive state, cells set and candidates
+The set, array, bitboard, delta and activity engines time these
+phases, the other engines only report the whole evolution time. The display adds
+the time spent drawing a generation with Metrics.render.
+
+The records of the latest generations are kept in a ring buffer, and
+handed to the sinks once complete, that is when the next generation
+starts or on flush(). A sink is any callable taking a Record, such as a
+CsvSink.
+
+usage:
+
+  sink = hexmetrics.CsvSink('metrics.csv')
+  metrics = world.instrument(sinks=[sink, print])
+  world.advance(100)
+  metrics.flush()
+  sink.close()
+'''
+
+import collections
+import csv
+import time
+
+FIELDS = ( 'cycles', 'population', 'births', 'deaths', 'candidates',
+           'count_ms', 'color_ms', 'rebuild_ms', 'evolve_ms', 'render_ms' )
+
+class Record:
+    """ Metrics of a generation. Times are in milliseconds, None when not
+        measured.
+    """
+    __slots__ = FIELDS
+
+    def __init__(self):
+        for name in FIELDS:
+            setattr(self, name, None)
+
+    def as_tuple(self):
+        return tuple( getattr(self, name) for name in FIELDS )
+
+    def __repr__(self):
+        return 'Record(%s)' % ', '.join( '%s=%r' % (name, getattr(self, name)) for name in FIELDS )
+
+class CsvSink:
+    """ Writes the records as the rows of a CSV file, after a header."""
+    def __init__(self, path):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(FIELDS)
+
+    def __call__(self, record):
+        self.writer.writerow( record.as_tuple() )
+
+    def close(self):
+        self.file.close()
+
+class Metrics:
+    """ Ring buffer of the records of the last capacity generations, and
+        the sinks receiving every record.
+    """
+    def __init__(self, capacity=1024, sinks=()):
+        self.records = collections.deque(maxlen=capacity)
+        self.sinks = list(sinks)
+        # record of the generation evolving, and of the last one evolved
+        # not handed to the sinks yet
+        self.current = None
+        self.pending = None
+        self.start = 0.0
+        self.last = 0.0
+
+    def begin(self):
+        """ Start the record of a new generation."""
+        self.flush()
+        self.current = Record()
+        self.start = self.last = time.perf_counter()
+
+    def mark(self, phase):
+        """ Add the time elapsed since the previous mark to a phase
+            ('count', 'color' or 'rebuild').
+        """
+        now = time.perf_counter()
+        name = phase + '_ms'
+        elapsed = 1000.0 * ( now - self.last )
+        previous = getattr(self.current, name)
+        setattr(self.current, name, elapsed if previous is None else previous + elapsed)
+        self.last = now
+
+    def end(self, world):
+        """ Complete the record of the generation with the world state."""
+        record = self.current
+        record.evolve_ms = 1000.0 * ( time.perf_counter() - self.start )
+        record.cycles = world.cycles
+        record.population = len(world.cells)
+        record.births = len(world.births)
+        record.deaths = len(world.deaths)
+        if world.engine is None:
+            record.candidates = len(world.potential_population)
+        elif hasattr(world.engine, 'pending'):
+            # the delta and activity engines keep their own candidates
+            record.candidates = len(world.engine.pending)
+        self.records.append(record)
+        self.current = None
+        self.pending = record
+
+    def render(self, seconds):
+        """ Set the render time of the last generation evolved."""
+        record = self.pending
+        if record is not None:
+            record.render_ms = 1000.0 * seconds
+
+    def flush(self):
+        """ Hand the last record to the sinks."""
+        record = self.pending
+        self.pending = None
+        if record is not None:
+            for sink in self.sinks:
+                sink(record)
+
+    def summary(self, n=30):
+        """ Returns a Record of the mean values over the last n records,
+            None for the values never measured, or None without records.
+        """
+        records = list(self.records)[-n:]
+        if not records:
+            return None
+        summary = Record()
+        for name in FIELDS:
+            values = [ getattr(r, name) for r in records if getattr(r, name) is not None ]
+            if values:
+                setattr(summary, name, sum(values) / len(values))
+        return summary
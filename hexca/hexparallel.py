@@ -0,0 +1,185 @@
+'''
+Multi-core tiled engine for the hexagonal game of life.
+
+The padded axial array of hexarray is split in bands of rows (constant q
+ranges), the axial tiles, each one stepped by its own worker process.
+
+The state lives in multiprocessing.shared_memory and is double buffered:
+at each generation every worker copies its tile together with the halo
+rows of its neighbor tiles from the current buffer, computes the tile
+with the very same functions as hexarray.ArrayEngine, and writes its own
+rows into the next buffer. The result is therefore bit-identical to the
+single process engines.
+
+The neighbors count only reads the direct neighbors (the extended term is
+derived from it), so the halo is one row deep.
+'''
+
+import multiprocessing
+import weakref
+from multiprocessing import shared_memory
+import numpy
+import hexarray
+
+# (name, dtype) of the state arrays
+STATE = ( ('alive', numpy.uint8), ('hue', numpy.int16), ('intensity', numpy.uint8) )
+
+HALO = 1
+
+def _attach_(name, shape, dtype):
+    """ Returns (shared memory, array view) of an existing block."""
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, numpy.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+def _worker_(conn, names, shape, rows, mask):
+    """ Worker process loop: steps the rows [rows[0], rows[1]) of the map
+        each time the generation parameters are received.
+    """
+    blocks = []
+    buffers = []
+    for b in range(0, 2):
+        arrays = {}
+        for field, dtype in STATE:
+            shm, arrays[field] = _attach_(names[b][field], shape, dtype)
+            blocks.append(shm)
+        buffers.append(arrays)
+    q0, q1 = rows
+    tile_mask = mask[q0-HALO:q1+HALO]
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        current, survive, born, factor = message
+        src = buffers[current]
+        dst = buffers[1 - current]
+        # halo exchange: copy the tile and the border rows of its neighbors
+        tile = [ src[field][q0-HALO:q1+HALO].copy() for field, dtype in STATE ]
+        result = hexarray.step(tile[0], tile[1], tile[2], tile_mask, survive, born, factor)
+        for (field, dtype), array in zip(STATE, result):
+            dst[field][q0:q1] = array[HALO:-HALO]
+        conn.send(True)
+    src = dst = arrays = buffers = None
+    for shm in blocks:
+        shm.close()
+
+def _shutdown_(processes, pipes, blocks):
+    for conn in pipes:
+        try:
+            conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+    for p in processes:
+        p.join()
+    for shm in blocks:
+        try:
+            shm.close()
+        except BufferError:
+            # arrays of a garbage collected engine may still be alive
+            pass
+        shm.unlink()
+
+class TiledEngine(hexarray.ArrayEngine):
+    """ Evolves the cells of an HexWorld with several worker processes,
+        one per axial tile.
+
+        The number of workers defaults to the number of CPUs. They are
+        started at the first evolution and stopped by close(), or when the
+        engine is garbage collected. A closed engine starts them again, in
+        new shared memory, at its next evolution.
+    """
+    def __init__(self, world, workers=None):
+        super(TiledEngine, self).__init__(world)
+        inner = self.mask.shape[0] - 2 * HALO
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        self.workers = max( 1, min(workers, inner) )
+        bounds = numpy.linspace(HALO, HALO + inner, self.workers + 1).astype(int)
+        self.tiles = list( zip( bounds[:-1].tolist(), bounds[1:].tolist() ) )
+        self._allocate_()
+
+    def _allocate_(self):
+        """ Create the shared memory buffers, the first one holding the
+            current state.
+        """
+        state = ( self.alive, self.hue, self.intensity )
+        shape = self.mask.shape
+        self.blocks = []
+        self.buffers = []
+        for b in range(0, 2):
+            arrays = {}
+            for field, dtype in STATE:
+                shm = shared_memory.SharedMemory( create=True,
+                            size=int( numpy.prod(shape) ) * numpy.dtype(dtype).itemsize )
+                self.blocks.append(shm)
+                arrays[field] = numpy.ndarray(shape, dtype=dtype, buffer=shm.buf)
+                arrays[field].fill(0)
+            self.buffers.append(arrays)
+        self._use_buffer_(0)
+        self.alive[:], self.hue[:], self.intensity[:] = state
+        self.processes = []
+        self.pipes = []
+        self._finalizer = weakref.finalize( self, _shutdown_,
+                                            self.processes, self.pipes, self.blocks )
+
+    def _use_buffer_(self, b):
+        self.current = b
+        self.alive = self.buffers[b]['alive']
+        self.hue = self.buffers[b]['hue']
+        self.intensity = self.buffers[b]['intensity']
+
+    def _start_(self):
+        names = [ { field: self.blocks[3*b + i].name for i, (field, dtype) in enumerate(STATE) }
+                  for b in range(0, 2) ]
+        for rows in self.tiles:
+            parent, child = multiprocessing.Pipe()
+            p = multiprocessing.Process( target=_worker_, daemon=True,
+                    args=(child, names, self.mask.shape, rows, self.mask) )
+            p.start()
+            self.processes.append(p)
+            self.pipes.append(parent)
+
+    def close(self):
+        """ Stop the workers and release the shared memory."""
+        if self.buffers is None:
+            return
+        self.alive = self.alive.copy()
+        self.hue = self.hue.copy()
+        self.intensity = self.intensity.copy()
+        self.buffers = None
+        self._finalizer()
+
+    def _step_(self):
+        """ Computes the next generation in the other buffer and switch to
+            it, without publishing it.
+        """
+        world = self.world
+        if self.buffers is None:
+            self._allocate_()
+        if not self.processes:
+            self._start_()
+        survive, born = hexarray.rule_tables(world)
+        message = ( self.current, survive, born, hexarray.extended_factor(world) )
+        for conn in self.pipes:
+            conn.send(message)
+        for conn in self.pipes:
+            conn.recv()
+        self._use_buffer_(1 - self.current)
+
+    def evolve(self):
+        if self.world.cells is not self.published:
+            self.load()
+        previous = self.alive
+        self._step_()
+        self.publish(previous)
+
+    def advance(self, generations):
+        """ Evolve the world by the given number of generations, publishing
+            the last one only. The workers still compute the colors of
+            every generation.
+        """
+        if self.world.cells is not self.published:
+            self.load()
+        previous = self.alive.copy()
+        for i in range(0, generations):
+            self._step_()
+        self.publish(previous)
@@ -0,0 +1,188 @@
+'''
+Raster rendering of an hexagonal map.
+
+Drawing one polygon per cell alive costs a Python call and a color
+conversion per cell at every frame. Instead, the polygons of all the cells
+are drawn once per map in an integer image, using the cell id as color.
+This lookup image maps every pixel of the screen to the cell it belongs
+to (or to the background).
+
+Each frame then only computes the colors of all the cells in a palette
+array, indexed by cell id, and writes palette[lookup] to the screen in a
+single vectorized gather through pygame.surfarray. The gather is limited
+to the bounding box of the map, and done on 32 bits mapped colors when
+the screen uses them.
+
+draw_changes only repaints the boxes of the cells whose color changed
+since the previous frame, found by comparing the palettes, and returns
+their rectangles for pygame.display.update.
+'''
+
+import numpy
+import pygame
+
+def cell_image(coords_map, topology, size):
+    """ Returns the lookup image of a map as an int32 array (width, height)
+        holding the id of the cell drawn at each pixel, or len(topology)
+        for the background. coords_map gives the corners of each cell in
+        screen coordinates.
+    """
+    surface = pygame.Surface(size, depth=32)
+    surface.fill(0)
+    ids = topology.cells_ids( coords_map.keys() )
+    for i, points in zip( ids.tolist(), coords_map.values() ):
+        # the mapped color is the id shifted by one, 0 is the background
+        pygame.draw.polygon(surface, i + 1, points)
+    image = pygame.surfarray.array2d(surface).astype(numpy.int32) & 0xFFFFFF
+    return numpy.where(image == 0, len(topology), image - 1).astype(numpy.int32)
+
+def hsv_colors(hue, saturation):
+    """ Returns the (n, 3) uint8 RGB colors of hues in degrees and
+        saturations in percent, at full value like pygame.Color.hsva.
+    """
+    h = ( numpy.asarray(hue) % 360 ) / 60.0
+    s = numpy.asarray(saturation) / 100.0
+    sector = numpy.floor(h).astype(numpy.intp) % 6
+    f = h - numpy.floor(h)
+    v = numpy.ones_like(s)
+    p = 1 - s
+    q = 1 - s * f
+    t = 1 - s * (1 - f)
+    channels = numpy.stack( ( numpy.choose(sector, (v, q, p, p, t, v)),
+                              numpy.choose(sector, (t, v, v, q, p, p)),
+                              numpy.choose(sector, (p, p, t, v, v, q)) ), axis=-1 )
+    # truncated like pygame
+    return ( channels * 255 ).astype(numpy.uint8)
+
+class RasterRenderer:
+    """ Draws the cells of an HexWorld from its hue and intensity arrays.
+        The drawing methods also take a state argument, any object with
+        hue and intensity arrays (a hexrunner.Snapshot for example), to
+        draw instead of the world.
+
+        The data structures used are:
+          - lookup = int32 array (width, height) : cell id of each pixel,
+            see cell_image
+          - palette = uint8 array (cells + 1, 3) : color of each cell id,
+            the last entry being the background color
+        Only the bounding box (rect) of the map is drawn, the rest of the
+        surface is left untouched.
+
+        draw_changes needs the surface to keep what was drawn on it: once
+        it has been modified by other means, invalidate() forces the next
+        frame to be drawn fully. Above max_changes cells changed, the
+        whole map is drawn instead of the cells boxes.
+    """
+    def __init__(self, world, coords_map, size, background=(0, 0, 0)):
+        self.world = world
+        self.size = tuple(size)
+        lookup = cell_image(coords_map, world.topology, size)
+        x, y = numpy.nonzero( lookup < len(world.topology) )
+        self.rect = pygame.Rect( x.min(), y.min(), x.max() - x.min() + 1, y.max() - y.min() + 1 )
+        self.lookup = numpy.ascontiguousarray( lookup[ self.rect.left:self.rect.right,
+                                                       self.rect.top:self.rect.bottom ] )
+        self.palette = numpy.zeros((len(world.topology) + 1, 3), dtype=numpy.uint8)
+        self.palette[-1] = background
+
+        # top left corner of the box of each cell in the lookup image, and
+        # size of the largest box
+        ids = world.topology.cells_ids( coords_map.keys() )
+        corners = numpy.array( list( coords_map.values() ) )
+        self.box_x = numpy.zeros(len(world.topology), dtype=numpy.intp)
+        self.box_y = numpy.zeros(len(world.topology), dtype=numpy.intp)
+        self.box_x[ids] = corners[:, :, 0].min(axis=1) - self.rect.left
+        self.box_y[ids] = corners[:, :, 1].min(axis=1) - self.rect.top
+        self.box_size = ( int( numpy.ptp(corners[:, :, 0], axis=1).max() ) + 1,
+                          int( numpy.ptp(corners[:, :, 1], axis=1).max() ) + 1 )
+        self.max_changes = len(world.topology) // 4
+        # mapped colors last drawn, None until the first full frame
+        self.shown = None
+
+    def update_palette(self, state=None):
+        """ Compute the colors of the cells from the world arrays. Dead
+            cells, whose intensity is 0, get the background color.
+        """
+        if state is None:
+            state = self.world
+        colors = hsv_colors(state.hue, state.intensity)
+        dead = state.intensity == 0
+        colors[dead] = self.palette[-1]
+        self.palette[:-1] = colors
+
+    def _mapped_palette_(self, surface):
+        """ Returns the palette as the uint32 mapped colors of a 32 bits
+            surface.
+        """
+        shifts = surface.get_shifts()
+        losses = surface.get_losses()
+        mapped = numpy.zeros(len(self.palette), dtype=numpy.uint32)
+        for k in range(0, 3):
+            mapped |= ( self.palette[:, k].astype(numpy.uint32) >> losses[k] ) << shifts[k]
+        # opaque on surfaces with an alpha channel
+        mapped |= numpy.uint32( (255 >> losses[3]) << shifts[3] )
+        return mapped
+
+    def invalidate(self):
+        """ Force the next draw_changes to draw the whole map."""
+        self.shown = None
+
+    def _draw_(self, surface):
+        target = surface.subsurface(self.rect)
+        if surface.get_bitsize() == 32:
+            mapped = self._mapped_palette_(surface)
+            pygame.surfarray.blit_array(target, mapped[self.lookup])
+            self.shown = mapped
+        else:
+            pygame.surfarray.blit_array(target, self.palette[self.lookup])
+            self.shown = None
+
+    def draw(self, surface, state=None):
+        """ Write the map to a surface of the renderer size."""
+        self.update_palette(state)
+        self._draw_(surface)
+
+    def draw_heatmap(self, surface, values, color=(255, 0, 0), alpha=0.6):
+        """ Blend a color over the map drawn on a 24 or 32 bits surface,
+            with the weight alpha * values[id] for the pixels of each cell,
+            values being between 0 and 1. The next draw_changes then draws
+            the whole map.
+        """
+        weight = numpy.zeros(len(self.palette), dtype=numpy.float32)
+        weight[:-1] = alpha * numpy.clip(values, 0, 1)
+        w = weight[self.lookup][:, :, numpy.newaxis]
+        pixels = pygame.surfarray.pixels3d( surface.subsurface(self.rect) )
+        pixels[...] = ( pixels * (1 - w) + numpy.asarray(color, dtype=numpy.float32) * w ).astype(numpy.uint8)
+        del pixels
+        self.invalidate()
+
+    def draw_changes(self, surface, state=None):
+        """ Repaint the boxes of the cells whose color changed since the
+            last frame drawn on the surface, and returns the list of the
+            rectangles modified.
+        """
+        self.update_palette(state)
+        if self.shown is None or surface.get_bitsize() != 32:
+            self._draw_(surface)
+            return [ self.rect.copy() ]
+        mapped = self._mapped_palette_(surface)
+        changed = numpy.flatnonzero(mapped != self.shown)
+        if len(changed) > self.max_changes:
+            self._draw_(surface)
+            return [ self.rect.copy() ]
+        self.shown = mapped
+        if len(changed) == 0:
+            return []
+
+        # the boxes include parts of the neighbors cells, whose pixels are
+        # rewritten with their current color
+        w, h = self.box_size
+        width, height = self.lookup.shape
+        x = self.box_x[changed]
+        y = self.box_y[changed]
+        xs = numpy.minimum( x[:, None, None] + numpy.arange(w)[None, :, None], width - 1 )
+        ys = numpy.minimum( y[:, None, None] + numpy.arange(h)[None, None, :], height - 1 )
+        pixels = pygame.surfarray.pixels2d( surface.subsurface(self.rect) )
+        pixels[xs, ys] = mapped[ self.lookup[xs, ys] ]
+        del pixels
+        left, top = self.rect.topleft
+        return [ pygame.Rect(left + i, top + j, w, h) for i, j in zip( x.tolist(), y.tolist() ) ]
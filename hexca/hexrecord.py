@@ -0,0 +1,106 @@
+'''
+Headless recording of an hexagonal world.
+
+Renders the evolution of a world on an offscreen surface, without any
+display, and streams the frames to disk:
+  - as a sequence of PNG files in a directory
+  - or as raw RGB frames on the standard output, to be piped to a video
+    encoder
+
+The world evolves in a hexrunner.HexRunner thread while the frames are
+rendered and written, no generation being dropped. The throughput is
+reported on the standard error at the end.
+
+run with:
+
+  python3 hexrecord.py frames --size 1280x720 --frames 300
+
+  python3 hexrecord.py - --raw --size 1280x720 --frames 300 |
+      ffmpeg -f rawvideo -pix_fmt rgb24 -s 1280x720 -r 30 -i - demo.mp4
+'''
+
+import argparse
+import os
+import sys
+import time
+# pygame prints a banner on the standard output, mixed with the raw frames
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+import pygame
+import hexu
+import hexmap
+import hexrunner
+import hexseed
+
+def parse_size(text):
+    """ Returns the (width, height) of a 'WIDTHxHEIGHT' string."""
+    width, height = text.lower().split('x')
+    return ( int(width), int(height) )
+
+def parse_rule(text):
+    """ Returns the rule of a compact string, for example {2, 3} for '23'."""
+    return set( int(c) for c in text )
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless recording of the hexagonal game of life.')
+    parser.add_argument('output', help='directory of the PNG frames, or - with --raw')
+    parser.add_argument('--raw', action='store_true',
+                        help='write raw RGB frames on the standard output')
+    parser.add_argument('--size', type=parse_size, default=(1280, 720), help='frame size, WIDTHxHEIGHT')
+    parser.add_argument('--hex-radius', type=int, default=10, help='radius of a cell in pixels')
+    parser.add_argument('--radius', type=int, default=None,
+                        help='map radius (default: the largest fitting in the frame)')
+    parser.add_argument('--frames', type=int, default=300, help='number of frames')
+    parser.add_argument('--step', type=int, default=1, help='generations between two frames')
+    parser.add_argument('--engine', default='set', help='evolution engine')
+    parser.add_argument('--environment', type=parse_rule, default={2, 3}, help='environment rule, e.g. 23')
+    parser.add_argument('--fertility', type=parse_rule, default={2}, help='fertility rule, e.g. 2')
+    parser.add_argument('--no-extended', action='store_true', help='do not use the extended neighbors')
+    parser.add_argument('--density', type=float, default=0.5, help='initial density')
+    parser.add_argument('--initial-radius', type=int, default=None,
+                        help='radius of the seeded area (default: 3/4 of the map radius)')
+    parser.add_argument('--seed', type=int, default=None, help='random generator seed')
+    parser.add_argument('--grid', action='store_true', help='draw the cells outlines')
+    parser.add_argument('--queue', type=int, default=8, help='generations evolved in advance')
+    args = parser.parse_args()
+
+    size = args.size
+    radius = args.radius
+    if radius is None:
+        radius = hexu.max_map_radius(args.hex_radius, size[1] - 8)
+    world = hexmap.HexMap(radius, args.hex_radius, size, args.engine)
+    world.set_rules(args.environment, args.fertility)
+    world.use_extended_neighbors = not args.no_extended
+    world.random( args.density, int(0.75 * radius) if args.initial_radius is None
+                                else args.initial_radius, rng=hexseed.generator(args.seed) )
+
+    if args.raw:
+        out = sys.stdout.buffer
+    else:
+        os.makedirs(args.output, exist_ok=True)
+    surface = pygame.Surface(size, depth=32)
+    surface.fill(hexmap.BLACK)
+
+    runner = hexrunner.HexRunner(world, queue_size=args.queue, drop=False,
+                                 generations=args.step)
+    runner.active = True
+    runner.start()
+    start = time.perf_counter()
+    try:
+        for i in range(0, args.frames):
+            snapshot = runner.next()
+            world.draw_cells(surface, snapshot)
+            if args.grid:
+                world.overlay_grid(surface)
+            if args.raw:
+                out.write( pygame.image.tobytes(surface, 'RGB') )
+            else:
+                pygame.image.save( surface, os.path.join(args.output, 'frame%05d.png' % i) )
+    finally:
+        runner.stop()
+    elapsed = time.perf_counter() - start
+    print( '%d frames of %dx%d, map radius %d, %d cells: %.1f frames/s'
+           % ( args.frames, size[0], size[1], radius, len(world), args.frames / elapsed ),
+           file=sys.stderr )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+'''
+Evolution of an HexWorld in a background thread.
+
+The display loop and the evolution run at their own pace: a slow
+generation no longer freezes the display, and a slow frame no longer
+slows the evolution down.
+
+The thread owns the world. After each generation it pushes a Snapshot of
+the world (colors arrays and the values shown on screen) in a bounded
+queue, dropping the oldest snapshot when the queue is full, and the
+display loop only draws the latest one.
+
+Everything modifying the world (rules, random, cluster...) is sent to the
+thread as a command with call(), and applied between two generations.
+A new snapshot is published right after, so that the effects show at
+once even when the evolution is paused.
+
+Without drop, no snapshot is ever lost: the thread waits for room in the
+queue, and the snapshots are consumed in order with next(). This is used
+to record every generation while the next ones are evolving.
+'''
+
+import collections
+import queue
+import threading
+import time
+
+class Snapshot:
+    """ State of a world after a generation, as published by an HexRunner.
+        hue and intensity are copies of the world arrays, so the renderer
+        can draw them while the world keeps evolving. activity is the
+        activity of every cell with the activity engine, None otherwise.
+    """
+    __slots__ = ( 'cycles', 'hue', 'intensity', 'population', 'period',
+                  'rules_environment', 'rules_fertility', 'use_extended_neighbors',
+                  'activity' )
+
+    def __init__(self, world):
+        self.cycles = world.cycles
+        self.hue = world.hue.copy()
+        self.intensity = world.intensity.copy()
+        self.population = len(world.cells)
+        self.period = world.period()
+        self.rules_environment = set(world.rules_environment)
+        self.rules_fertility = set(world.rules_fertility)
+        self.use_extended_neighbors = world.use_extended_neighbors
+        if hasattr(world.engine, 'cells_activity'):
+            self.activity = world.engine.cells_activity()
+        else:
+            self.activity = None
+
+class HexRunner:
+    """ Evolves an HexWorld in a background thread.
+
+        The runner starts paused: set active to run the evolution, at most
+        rate steps per second (None for no limit). Each step advances the
+        world by the given number of generations, and step() runs a
+        single one.
+    """
+    def __init__(self, world, rate=None, queue_size=4, drop=True, generations=1):
+        self.world = world
+        self.rate = rate
+        self.drop = drop
+        self.generations = generations
+        self.active = False
+        self.snapshots = queue.Queue(queue_size)
+        self.commands = queue.Queue()
+        self.wake = threading.Event()
+        self.stopped = False
+        # (time, generations) of the recent steps, for generations_per_second
+        self.times = collections.deque()
+        self.thread = threading.Thread(target=self._run_, daemon=True)
+
+    def start(self):
+        self._publish_()
+        self.thread.start()
+
+    def stop(self):
+        self.stopped = True
+        self.wake.set()
+        self.thread.join()
+
+    def call(self, function, *args):
+        """ Run function(*args) in the evolution thread, between two
+            generations.
+        """
+        self.commands.put( (function, args) )
+        self.wake.set()
+
+    def step(self):
+        """ Advance the world by a single step."""
+        self.call(self.world.advance, self.generations)
+
+    def latest(self):
+        """ Returns the most recent snapshot published since the last call,
+            or None.
+        """
+        snapshot = None
+        try:
+            while True:
+                snapshot = self.snapshots.get_nowait()
+        except queue.Empty:
+            return snapshot
+
+    def next(self, timeout=None):
+        """ Returns the oldest snapshot not consumed yet, waiting for it.
+            Raises queue.Empty after timeout seconds.
+        """
+        return self.snapshots.get(timeout=timeout)
+
+    def generations_per_second(self):
+        """ Returns the number of generations evolved in the last second."""
+        times = list(self.times)
+        now = time.perf_counter()
+        return sum( n for t, n in times if now - t <= 1.0 )
+
+    def _publish_(self):
+        snapshot = Snapshot(self.world)
+        if not self.drop:
+            while not self.stopped:
+                try:
+                    self.snapshots.put(snapshot, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+            return
+        while True:
+            try:
+                self.snapshots.put_nowait(snapshot)
+                return
+            except queue.Full:
+                # the display is late: drop the oldest snapshot
+                try:
+                    self.snapshots.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def _run_(self):
+        next_generation = time.perf_counter()
+        while not self.stopped:
+            self.wake.clear()
+            changed = False
+            while True:
+                try:
+                    function, args = self.commands.get_nowait()
+                except queue.Empty:
+                    break
+                function(*args)
+                changed = True
+
+            delay = None
+            if self.active:
+                now = time.perf_counter()
+                if now >= next_generation:
+                    self.world.advance(self.generations)
+                    changed = True
+                    self.times.append( (now, self.generations) )
+                    while self.times and now - self.times[0][0] > 1.0:
+                        self.times.popleft()
+                    if self.rate:
+                        next_generation = max( now, next_generation + 1.0 / self.rate )
+                    else:
+                        next_generation = now
+                else:
+                    delay = next_generation - now
+            else:
+                delay = 0.1
+                next_generation = time.perf_counter()
+
+            if changed:
+                self._publish_()
+            if delay is not None:
+                # commands interrupt the wait
+                self.wake.wait(delay)
@@ -0,0 +1,78 @@
+'''
+Seeding of hexagonal worlds with numpy random generators.
+
+HexWorld.random and HexWorld.cluster historically draw every cell and
+every color with the global random module, one Python call per cell. The
+functions below build the same kind of initial states in bulk, as arrays
+of axial coordinates (N, 2), from a numpy.random.Generator: the time
+depends on the size of the arrays only, and a given seed always gives
+the same world.
+
+Shapes (hexagons, rings, stamped patterns) are combined freely, thinned
+to a density with select, and placed with HexWorld.seed.
+
+usage:
+
+  rng = hexseed.generator(42)
+  world.random(0.5, 100, rng=rng)
+  world.seed( hexseed.select( hexseed.ring(20, width=3), 0.6, rng ), rng=rng )
+  world.seed( hexseed.stamp( glider, hexseed.hexagon(2) * 30 ), hue=180 )
+'''
+
+import numpy
+import hexu
+
+# Hues of the cells of random worlds, and of the clusters
+HUES = numpy.array( [60, 60, 60, 60, 180, 300], dtype=numpy.int16 )
+CLUSTER_HUES = numpy.array( [60, 180, 300], dtype=numpy.int16 )
+
+def generator(seed=None):
+    """ Returns a numpy Generator from a seed, or the given Generator."""
+    if isinstance(seed, numpy.random.Generator):
+        return seed
+    return numpy.random.default_rng(seed)
+
+def hexagon(radius, center=(0, 0)):
+    """ Returns the cells of an hexagon of a given radius."""
+    return hexu.hexagonal_map(radius) + numpy.asarray(center, dtype=numpy.int32)
+
+def ring(radius, center=(0, 0), width=1):
+    """ Returns the cells at a distance from radius - width + 1 to radius
+        of the center.
+    """
+    cells = hexu.hexagonal_map(radius)
+    cells = cells[ hexu.origin_distances(cells) > radius - width ]
+    return cells + numpy.asarray(center, dtype=numpy.int32)
+
+def stamp(pattern, centers):
+    """ Returns the cells of a pattern (M, 2), relative to its center,
+        copied at every center (N, 2), as an array (N * M, 2).
+    """
+    cells = hexu.cells_array(centers)[:, numpy.newaxis, :] + hexu.cells_array(pattern)
+    return cells.reshape(-1, 2)
+
+def select(cells, density, rng):
+    """ Returns the cells kept with a probability density each."""
+    cells = hexu.cells_array(cells)
+    return cells[ rng.random(len(cells)) < density ]
+
+def hues(number, rng):
+    """ Returns the hues of random cells, drawn from HUES."""
+    return rng.choice(HUES, size=number)
+
+def clusters(number, seed_radius, density, max_radius, rng):
+    """ Returns (cells, hue) arrays of a number of hexagonal clusters of
+        seed_radius +/- seed_radius // 2, centered within max_radius of
+        the origin. A cluster covers the previous ones.
+    """
+    variation = seed_radius // 2
+    centers = hexagon(max_radius)[ rng.integers(0, 3 * max_radius * (max_radius + 1) + 1,
+                                                size=number) ]
+    radius = seed_radius + rng.integers(-variation, variation + 1, size=number)
+    colors = rng.choice(CLUSTER_HUES, size=number)
+    shape = hexu.hexagonal_map(seed_radius + variation)
+    inside = ( hexu.origin_distances(shape) <= radius[:, numpy.newaxis] ) & \
+             ( rng.random( (number, len(shape)) ) < density )
+    cells = ( centers[:, numpy.newaxis, :] + shape )[inside]
+    hue = numpy.repeat(colors, inside.sum(axis=1))
+    return cells, hue
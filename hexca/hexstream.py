@@ -0,0 +1,381 @@
+'''
+Streaming of an hexagonal world to remote viewers.
+
+The server evolves a world headlessly and streams its generations over
+TCP to any number of clients. Each generation is encoded once, whatever
+the number of clients, as a delta: the cells whose hue or intensity
+changed (births, deaths and fading colors), a cell being alive when its
+intensity is not 0. Keyframes holding the whole state, in the snapshot
+format of hexcheckpoint, are sent to the new clients, periodically to
+everyone, and to the clients which lost deltas. A generation is also
+sent as a keyframe when that is smaller than its delta, which happens in
+very active worlds where most cells change at every generation.
+
+Every client has a bounded queue of frames, written to its socket at the
+pace the socket drains. When a slow client lets its queue fill up, its
+pending frames are dropped and it is resynchronized with the next
+keyframe, so it skips generations instead of slowing down the others.
+
+Stream format, little endian: a sequence of frames made of a header,
+kind (uint8), cycles (uint64) and payload size (uint32), followed by
+the payload:
+  - HELLO: format version (uint16), map radius (uint32)
+  - KEYFRAME: zlib compressed hexcheckpoint snapshot
+  - DELTA: zlib compressed bit masks (numpy.packbits, little bit order,
+    one bit per cell id) of the cells whose hue changed and of the cells
+    whose intensity changed, followed by the new hue (uint16) and the
+    new intensity (uint8) of these cells, in increasing id order
+
+The viewer is a thin pygame client drawing the stream with HexMap.
+
+run with:
+
+  python3 hexstream.py serve --port 8765 --radius 100 --engine delta
+  python3 hexstream.py view localhost:8765 --size 1280x720
+'''
+
+import argparse
+import asyncio
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+import zlib
+import numpy
+import hexcheckpoint
+import hexseed
+
+VERSION = 2
+FRAME = struct.Struct('<BQI')
+HELLO_PAYLOAD = struct.Struct('<HI')
+HELLO, KEYFRAME, DELTA = 0, 1, 2
+
+def frame(kind, cycles, payload):
+    """ Returns the bytes of a frame."""
+    return FRAME.pack(kind, cycles, len(payload)) + payload
+
+class StreamEncoder:
+    """ Encodes the generations of a world as frames, keeping the colors
+        last encoded to compute the deltas.
+    """
+    def __init__(self, world):
+        self.world = world
+        self.hue = world.hue.copy()
+        self.intensity = world.intensity.copy()
+
+    def hello(self):
+        return frame( HELLO, self.world.cycles,
+                      HELLO_PAYLOAD.pack(VERSION, self.world.map_radius) )
+
+    def keyframe(self):
+        """ Returns the keyframe of the current state of the world."""
+        return frame( KEYFRAME, self.world.cycles,
+                      zlib.compress( hexcheckpoint.encode(self.world), 1 ) )
+
+    def delta(self):
+        """ Returns the delta frame from the state of the previous call,
+            or a keyframe if it is smaller.
+        """
+        world = self.world
+        hue = world.hue != self.hue
+        intensity = world.intensity != self.intensity
+        self.hue[hue] = world.hue[hue]
+        self.intensity[intensity] = world.intensity[intensity]
+        # the masks compress well, the colors of the cells decide which
+        # of the delta and of the keyframe is the smallest
+        changed = 2 * numpy.count_nonzero(hue) + numpy.count_nonzero(intensity)
+        if changed > 3 * len(world.cells):
+            return self.keyframe()
+        payload = b''.join( ( numpy.packbits(hue, bitorder='little').tobytes(),
+                              numpy.packbits(intensity, bitorder='little').tobytes(),
+                              self.hue[hue].astype('<u2').tobytes(),
+                              self.intensity[intensity].tobytes() ) )
+        return frame( DELTA, world.cycles, zlib.compress(payload, 1) )
+
+class StreamState:
+    """ State of a streamed world, decoded from its frames: hue and
+        intensity arrays, which HexMap draws as any world state.
+    """
+    def __init__(self, map_radius):
+        self.map_radius = map_radius
+        size = 3 * map_radius * (map_radius + 1) + 1
+        self.hue = numpy.zeros(size, dtype=numpy.int16)
+        self.intensity = numpy.zeros(size, dtype=numpy.uint8)
+        self.cycles = 0
+        self.synchronized = False
+        self.rules_environment = set()
+        self.rules_fertility = set()
+        self.use_extended_neighbors = True
+
+    @property
+    def population(self):
+        return int( numpy.count_nonzero(self.intensity) )
+
+    def apply(self, kind, cycles, payload):
+        """ Update the state with a KEYFRAME or DELTA frame. Deltas are
+            ignored until the first keyframe.
+        """
+        if kind == KEYFRAME:
+            snapshot = hexcheckpoint.Snapshot( zlib.decompress(payload), 0, len(self.hue) )
+            ids = snapshot.ids()
+            self.hue.fill(0)
+            self.intensity.fill(0)
+            self.hue[ids] = snapshot.hue
+            self.intensity[ids] = snapshot.intensity
+            self.rules_environment = snapshot.rules_environment
+            self.rules_fertility = snapshot.rules_fertility
+            self.use_extended_neighbors = snapshot.use_extended_neighbors
+            self.synchronized = True
+        elif kind == DELTA and self.synchronized:
+            data = numpy.frombuffer( zlib.decompress(payload), dtype=numpy.uint8 )
+            size = len(self.hue)
+            mask = ( size + 7 ) // 8
+            hue = numpy.unpackbits(data[:mask], count=size, bitorder='little').astype(bool)
+            intensity = numpy.unpackbits(data[mask:2*mask], count=size, bitorder='little').astype(bool)
+            n = numpy.count_nonzero(hue)
+            self.hue[hue] = data[2*mask:2*mask + 2*n].view('<u2')
+            self.intensity[intensity] = data[2*mask + 2*n:]
+        else:
+            return
+        self.cycles = cycles
+
+class _Client:
+    """ Connection of a viewer, with its queue of frames."""
+    def __init__(self, writer, queue_size):
+        self.writer = writer
+        self.queue = asyncio.Queue(queue_size)
+        # True while the client waits for a keyframe
+        self.resync = True
+        self.dropped = 0
+
+    def _drop_(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.dropped += 1
+
+    def push(self, data, keyframe=False):
+        if self.queue.full():
+            # the client is late: drop its frames until the next keyframe
+            self._drop_()
+            self.resync = True
+        if keyframe:
+            self.resync = False
+        if not self.resync:
+            self.queue.put_nowait(data)
+
+    def close(self):
+        """ Stop sending, the pending frames are dropped."""
+        self._drop_()
+        self.queue.put_nowait(None)
+
+class StreamServer:
+    """ Evolves a world and streams it to the connected clients, at most
+        rate frames per second (None for no limit), each frame advancing
+        the world by the given number of generations.
+    """
+    def __init__(self, world, rate=10, generations=1, keyframe_interval=100, queue_size=8):
+        self.world = world
+        self.rate = rate
+        self.generations = generations
+        self.keyframe_interval = keyframe_interval
+        self.queue_size = queue_size
+        self.encoder = StreamEncoder(world)
+        self.clients = set()
+        self.frames = 0
+
+    async def serve(self, host='localhost', port=8765, frames=None):
+        """ Run the server, for a number of frames or forever."""
+        server = await asyncio.start_server(self._connect_, host, port)
+        async with server:
+            await self._simulate_(frames)
+            for client in list(self.clients):
+                client.close()
+            while self.clients:
+                await asyncio.sleep(0.01)
+
+    async def _connect_(self, reader, writer):
+        client = _Client(writer, self.queue_size)
+        self.clients.add(client)
+        try:
+            writer.write( self.encoder.hello() )
+            while True:
+                data = await client.queue.get()
+                if data is None:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except ( ConnectionError, asyncio.CancelledError ):
+            pass
+        finally:
+            self.clients.discard(client)
+            writer.close()
+
+    def _broadcast_(self):
+        delta = self.encoder.delta()
+        keyframe = delta if delta[0] == KEYFRAME else None
+        periodic = self.frames % self.keyframe_interval == 0
+        for client in list(self.clients):
+            if client.resync or periodic:
+                if keyframe is None:
+                    keyframe = self.encoder.keyframe()
+                client.push(keyframe, True)
+            else:
+                client.push(delta, delta is keyframe)
+
+    async def _simulate_(self, frames):
+        loop = asyncio.get_running_loop()
+        next_frame = time.perf_counter()
+        while frames is None or self.frames < frames:
+            # the evolution runs in a thread, the connections meanwhile
+            await loop.run_in_executor(None, self.world.advance, self.generations)
+            self.frames += 1
+            self._broadcast_()
+            if self.rate:
+                next_frame = max( time.perf_counter(), next_frame + 1.0 / self.rate )
+                await asyncio.sleep( next_frame - time.perf_counter() )
+            else:
+                await asyncio.sleep(0)
+
+class StreamClient:
+    """ Receives a stream in a background thread, into a StreamState."""
+    def __init__(self, host, port):
+        self.socket = socket.create_connection( (host, port) )
+        self.file = self.socket.makefile('rb')
+        kind, cycles, payload = self.read()
+        if kind != HELLO:
+            raise ValueError('not an hexagonal world stream')
+        version, map_radius = HELLO_PAYLOAD.unpack(payload)
+        if version != VERSION:
+            raise ValueError('unsupported stream version %d' % version)
+        self.state = StreamState(map_radius)
+        self.lock = threading.Lock()
+        self.closed = False
+        self.thread = threading.Thread(target=self._run_, daemon=True)
+
+    def read(self):
+        """ Returns the (kind, cycles, payload) of the next frame."""
+        header = self.file.read(FRAME.size)
+        if len(header) < FRAME.size:
+            raise ConnectionError('end of stream')
+        kind, cycles, size = FRAME.unpack(header)
+        return kind, cycles, self.file.read(size)
+
+    def start(self):
+        self.thread.start()
+
+    def close(self):
+        self.closed = True
+        self.socket.close()
+
+    def _run_(self):
+        try:
+            while not self.closed:
+                kind, cycles, payload = self.read()
+                with self.lock:
+                    self.state.apply(kind, cycles, payload)
+        except ( ConnectionError, OSError, ValueError, IndexError, zlib.error, struct.error ):
+            # end of the stream, or a corrupt frame
+            self.close()
+
+def parse_rule(text):
+    """ Returns the rule of a comma separated list of neighbors counts,
+        for example {2, 3} for '2,3'.
+    """
+    return set( int(c) for c in text.split(',') if c.strip() )
+
+def parse_address(text):
+    """ Returns the (host, port) of a 'host:port' string."""
+    host, port = text.rsplit(':', 1)
+    return host, int(port)
+
+def serve(args):
+    import hexworld
+    world = hexworld.HexWorld(args.radius, args.engine)
+    world.set_rules(args.environment, args.fertility)
+    world.use_extended_neighbors = not args.no_extended
+    world.random( args.density, int(0.75 * args.radius) if args.initial_radius is None
+                                else args.initial_radius, rng=hexseed.generator(args.seed) )
+    server = StreamServer( world, args.rate or None, args.step, args.keyframe, args.queue )
+    print( 'streaming a world of radius %d on %s:%d' % (args.radius, args.host, args.port),
+           file=sys.stderr )
+    try:
+        asyncio.run( server.serve(args.host, args.port) )
+    except KeyboardInterrupt:
+        pass
+
+def view(args):
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    import pygame
+    import hexu
+    import hexmap
+    client = StreamClient( *parse_address(args.address) )
+    radius = client.state.map_radius
+    width, height = args.size
+    # largest cells fitting the window
+    hex_radius = 1
+    while hexu.max_map_radius(hex_radius + 1, height - 8) >= radius:
+        hex_radius += 1
+    pygame.init()
+    screen = pygame.display.set_mode(args.size)
+    pygame.display.set_caption('hexstream %s' % args.address)
+    hmap = hexmap.HexMap(radius, hex_radius, args.size)
+    font = pygame.font.Font(None, 24)
+    clock = pygame.time.Clock()
+    client.start()
+    done = False
+    while not done and not client.closed:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or ( event.type == pygame.KEYDOWN and
+                                              event.key == pygame.K_ESCAPE ):
+                done = True
+        screen.fill(hexmap.BLACK)
+        with client.lock:
+            hmap.draw_cells(screen, client.state)
+            text = 'cycles: %d, population: %d' % ( client.state.cycles, client.state.population )
+        if args.grid:
+            hmap.overlay_grid(screen)
+        screen.blit( font.render(text, 1, (0, 255, 0)), (10, 10) )
+        pygame.display.flip()
+        clock.tick(30)
+    client.close()
+    pygame.quit()
+
+def main():
+    parser = argparse.ArgumentParser(description='Streaming of the hexagonal game of life.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    server = commands.add_parser('serve', help='evolve a world and stream it')
+    server.add_argument('--host', default='localhost')
+    server.add_argument('--port', type=int, default=8765)
+    server.add_argument('--radius', type=int, default=100, help='map radius')
+    server.add_argument('--engine', default='set', help='evolution engine')
+    server.add_argument('--environment', type=parse_rule, default={2, 3},
+                        help='environment rule, comma separated counts, e.g. 2,3')
+    server.add_argument('--fertility', type=parse_rule, default={2},
+                        help='fertility rule, comma separated counts, e.g. 2')
+    server.add_argument('--no-extended', action='store_true', help='do not use the extended neighbors')
+    server.add_argument('--density', type=float, default=0.5, help='initial density')
+    server.add_argument('--initial-radius', type=int, default=None,
+                        help='radius of the seeded area (default: 3/4 of the map radius)')
+    server.add_argument('--seed', type=int, default=None, help='random generator seed')
+    server.add_argument('--rate', type=float, default=10, help='frames per second, 0 for no limit')
+    server.add_argument('--step', type=int, default=1, help='generations between two frames')
+    server.add_argument('--keyframe', type=int, default=100, help='frames between two keyframes')
+    server.add_argument('--queue', type=int, default=8, help='frames queued per client')
+
+    viewer = commands.add_parser('view', help='draw a stream')
+    viewer.add_argument('address', help='server address, host:port')
+    viewer.add_argument('--size', type=lambda t: tuple( int(v) for v in t.lower().split('x') ),
+                        default=(1280, 720), help='window size, WIDTHxHEIGHT')
+    viewer.add_argument('--grid', action='store_true', help='draw the cells outlines')
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        serve(args)
+    else:
+        view(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+'''
+Headless sweep of the rules space.
+
+Enumerates the environment / fertility rules combinations, without and
+with the extended neighbors (for several extended neighbors factors), and
+evolves each of these rule points from several random seeds.
+
+Each rule point is a task of a process pool, evolving its seeds together
+in an hexensemble.HexEnsemble. A world stops as soon as it is extinct,
+explodes (its population goes over a fraction of the map) or becomes
+periodic (its state was already seen in the last generations), so the
+sweep does not waste time on settled worlds.
+
+The results are appended to a CSV file, one row per rule point and seed,
+as soon as a rule point is finished. Restarting a sweep with the same
+file skips the rule points already present in it, after removing the
+rows of a rule point partially written by an interrupted sweep.
+
+run with:
+
+  python3 hexsweep.py sweep.csv --radius 20 --seeds 8 --factors 2 3
+'''
+
+import argparse
+import collections
+import csv
+import itertools
+import multiprocessing
+import os
+import numpy
+import hexensemble
+
+COLUMNS = ( 'environment', 'fertility', 'factor', 'seed', 'outcome',
+            'generation', 'period', 'population' )
+
+def rule_name(rule):
+    """ String of a rule, for example '2-3' for {2, 3}. The counts are
+        separated, the extended neighbors counts going over 9.
+    """
+    return '-'.join( str(n) for n in sorted(rule) )
+
+def parse_rule(name):
+    """ Returns the rule of a string, see rule_name."""
+    return set( int(c) for c in name.split('-') )
+
+def reachable_counts(factor):
+    """ Returns the neighbors counts reachable with an extended neighbors
+        factor, 0 meaning no extended neighbors: k + k // factor for 1 to
+        6 direct neighbors alive. The other counts never change a rule.
+    """
+    if factor == 0:
+        return list( range(1, 7) )
+    return [ k + k // factor for k in range(1, 7) ]
+
+def rules_points(max_count, factors):
+    """ Yields every (environment, fertility, factor) rule point, the rules
+        being made of the counts reachable with the factor. A factor of 0
+        means no extended neighbors. A max_count of None sweeps all the
+        reachable counts.
+    """
+    for factor in [0] + list(factors):
+        counts = [ n for n in reachable_counts(factor) if max_count is None or n <= max_count ]
+        subsets = [ set(c) for k in range(1, len(counts) + 1)
+                           for c in itertools.combinations(counts, k) ]
+        for environment in subsets:
+            for fertility in subsets:
+                yield ( rule_name(environment), rule_name(fertility), factor )
+
+def finished_points(path, seeds):
+    """ Returns the set of rule points already stored in a results file,
+        with a row for each of the given number of seeds. The file is
+        truncated after the last of them, removing a partially written
+        line or rule point left by an interrupted sweep.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, 'r+b') as f:
+        data = f.read()
+        # end of the header, then of the last complete rule point
+        end = 0
+        offset = 0
+        point = None
+        for line in data.splitlines(keepends=True):
+            offset += len(line)
+            if not line.endswith(b'\n'):
+                break
+            row = next( csv.reader( [ line.decode() ] ) )
+            if len(row) != len(COLUMNS):
+                break
+            if end == 0:
+                end = offset
+                continue
+            if ( row[0], row[1], row[2] ) != point:
+                point = ( row[0], row[1], row[2] )
+                rows = 0
+            rows += 1
+            if rows == seeds:
+                done.add( ( row[0], row[1], int(row[2]) ) )
+                end = offset
+                point = None
+        if end < len(data):
+            f.truncate(end)
+    return done
+
+# Ensemble reused by the tasks of a worker process
+_ensemble = None
+
+def run_point(task):
+    """ Evolves all the seeds of a rule point and returns the result rows."""
+    global _ensemble
+    point, config = task
+    environment, fertility, factor = point
+    if ( _ensemble is None or _ensemble.map_radius != config['radius']
+                           or len(_ensemble) != config['seeds'] ):
+        _ensemble = hexensemble.HexEnsemble( config['radius'], config['seeds'],
+                                             config['cache_dir'] )
+    ensemble = _ensemble
+    ensemble.set_rules( slice(None), parse_rule(environment), parse_rule(fertility), factor )
+    ensemble.random( config['density'], config['initial_radius'], config['seed'] )
+
+    cells = ensemble.alive.shape[1] - 1
+    explosion = config['explosion'] * cells
+    window = config['window']
+    active = numpy.ones(len(ensemble), dtype=bool)
+    outcome = [ 'running' ] * len(ensemble)
+    generation = [ config['generations'] ] * len(ensemble)
+    period = [ 0 ] * len(ensemble)
+    population = ensemble.population()
+    # recent states of each world: hash -> generation
+    seen = [ collections.OrderedDict() for i in range( len(ensemble) ) ]
+
+    for g in range(1, config['generations'] + 1):
+        ensemble.evolve()
+        population = ensemble.population()
+        for b in numpy.flatnonzero(active):
+            if population[b] == 0:
+                outcome[b] = 'extinct'
+            elif population[b] > explosion:
+                outcome[b] = 'explosion'
+            else:
+                h = hash( ensemble.alive[b].tobytes() )
+                if h in seen[b]:
+                    outcome[b] = 'periodic'
+                    period[b] = g - seen[b][h]
+                else:
+                    seen[b][h] = g
+                    if len(seen[b]) > window:
+                        seen[b].popitem(last=False)
+                    continue
+            active[b] = False
+            generation[b] = g
+        if not active.any():
+            break
+
+    return [ ( environment, fertility, factor, b, outcome[b], generation[b],
+               period[b], int( population[b] ) ) for b in range( len(ensemble) ) ]
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep of the hexagonal game of life rules.')
+    parser.add_argument('output', help='CSV results file, appended to')
+    parser.add_argument('--radius', type=int, default=20, help='map radius')
+    parser.add_argument('--initial-radius', type=int, default=None,
+                        help='radius of the seeded area (default: half the map radius)')
+    parser.add_argument('--density', type=float, default=0.5, help='initial density')
+    parser.add_argument('--seeds', type=int, default=8, help='worlds per rule point')
+    parser.add_argument('--seed', type=int, default=0, help='random generator seed')
+    parser.add_argument('--generations', type=int, default=500,
+                        help='maximum number of generations')
+    parser.add_argument('--max-count', type=int, default=None,
+                        help='largest neighbors count used in the rules '
+                             '(default: all the counts reachable with each factor)')
+    parser.add_argument('--factors', type=int, nargs='*', default=[3],
+                        help='extended neighbors factors to sweep')
+    parser.add_argument('--explosion', type=float, default=0.6,
+                        help='fraction of the map population considered an explosion')
+    parser.add_argument('--window', type=int, default=64,
+                        help='number of recent states checked for periodicity')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes')
+    parser.add_argument('--cache-dir', default=None, help='topology cache directory')
+    args = parser.parse_args()
+
+    config = { 'radius': args.radius, 'density': args.density, 'seeds': args.seeds,
+               'seed': args.seed, 'generations': args.generations,
+               'explosion': args.explosion, 'window': args.window,
+               'cache_dir': args.cache_dir,
+               'initial_radius': args.radius // 2 if args.initial_radius is None
+                                 else args.initial_radius }
+
+    done = finished_points(args.output, args.seeds)
+    points = [ p for p in rules_points(args.max_count, args.factors) if p not in done ]
+    print('%d rule points to run, %d already done' % ( len(points), len(done) ))
+
+    new_file = not os.path.exists(args.output) or os.path.getsize(args.output) == 0
+    with open(args.output, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(COLUMNS)
+        with multiprocessing.Pool(args.workers) as pool:
+            tasks = [ (p, config) for p in points ]
+            for i, rows in enumerate( pool.imap_unordered(run_point, tasks) ):
+                # a rule point is written at once, an interruption leaves
+                # at most its rows partially written, see finished_points
+                writer.writerows(rows)
+                f.flush()
+                if (i + 1) % 100 == 0:
+                    print('%d / %d' % ( i + 1, len(points) ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+'''
+Compact topology of an hexagonal map.
+
+Every cell of the map gets a dense integer id, following the order of
+hexu.hexagonal_map_gen (increasing q, then increasing r). The neighbors of
+the cells are stored in flat int32 arrays using a CSR (Compressed Sparse
+Row) layout: the neighbors ids of cell i are
+    indices[ offsets[i] : offsets[i+1] ]
+
+This replaces a dictionary of sets of tuples, which costs several
+kilobytes per cell, by a few tens of bytes per cell.
+
+The index is built with array operations, and can be persisted in a cache
+directory as one .npy file per array. Cached indexes are memory-mapped
+read-only when loaded, so that they are available in milliseconds and
+their pages are shared between all the processes using the same radius.
+'''
+
+import os
+import shutil
+import tempfile
+import numpy
+import hexu
+
+ARRAYS = ( 'coords', 'index', 'direct_offsets', 'direct_indices',
+           'extended_offsets', 'extended_indices' )
+
+def _compress_(neighbors):
+    """ Returns the CSR (offsets, indices) arrays of a dense neighbors
+        table where missing neighbors are marked with -1.
+    """
+    valid = neighbors >= 0
+    offsets = numpy.zeros(len(neighbors) + 1, dtype=numpy.int32)
+    numpy.cumsum(valid.sum(axis=1), out=offsets[1:])
+    return offsets, neighbors[valid].astype(numpy.int32)
+
+def build(map_radius):
+    """ Computes the index arrays of an hexagonal map, returned in a
+        dictionary keyed by the names listed in ARRAYS.
+    """
+    width = 2 * map_radius + 1
+    coords = hexu.hexagonal_map(map_radius)
+    index = numpy.full((width, width), -1, dtype=numpy.int32)
+    index[ coords[:, 0] + map_radius, coords[:, 1] + map_radius ] = numpy.arange(len(coords))
+
+    padded = numpy.full((width + 4, width + 4), -1, dtype=numpy.int32)
+    padded[2:-2, 2:-2] = index
+    cq = coords[:, 0] + map_radius + 2
+    cr = coords[:, 1] + map_radius + 2
+    arrays = { 'coords': coords, 'index': index }
+    for name, shifts in ( ('direct', hexu.DIRECTIONS),
+                          ('extended', hexu.cells_rings((0, 0), 2)[0]) ):
+        neighbors = padded[ cq[:, numpy.newaxis] + shifts[:, 0], cr[:, numpy.newaxis] + shifts[:, 1] ]
+        arrays[name + '_offsets'], arrays[name + '_indices'] = _compress_(neighbors)
+    return arrays
+
+def cache_path(cache_dir, map_radius):
+    """ Returns the directory holding the cached index of a map radius."""
+    return os.path.join(cache_dir, 'hextopo-r%d' % map_radius)
+
+def save(arrays, cache_dir, map_radius):
+    """ Store index arrays in the cache. The files are written in a
+        temporary directory first and then renamed, so that concurrent
+        processes never see a partial cache entry.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=cache_dir)
+    for name in ARRAYS:
+        numpy.save(os.path.join(tmp, name + '.npy'), arrays[name])
+    try:
+        os.rename(tmp, cache_path(cache_dir, map_radius))
+    except OSError:
+        # another process stored the same entry first
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def load(map_radius, cache_dir=None):
+    """ Returns the HexTopology of a map radius.
+
+        Without cache_dir the index is simply built. Otherwise it is
+        memory-mapped from the cache, after being built and stored there
+        if it was missing.
+    """
+    if cache_dir is None:
+        return HexTopology(map_radius)
+    path = cache_path(cache_dir, map_radius)
+    if not os.path.isdir(path):
+        save(build(map_radius), cache_dir, map_radius)
+    arrays = { name: numpy.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+               for name in ARRAYS }
+    return HexTopology(map_radius, arrays)
+
+class HexTopology:
+    """ Neighbor index of an hexagonal map of a given radius.
+
+        The data structures used are:
+          - coords = int32 array (size, 2) : id -> (q, r)
+          - index = int32 array (2R+1, 2R+1) : [q+R, r+R] -> id, or -1
+            outside of the hexagonal map
+          - direct_offsets, direct_indices : direct neighbors (CSR)
+          - extended_offsets, extended_indices : second order neighbors,
+            ie the ring at distance 2 (CSR)
+        Neighbors falling outside the map are not stored, and they are
+        listed in hexu.directions / hexu.cell_ring order.
+    """
+    def __init__(self, map_radius, arrays=None):
+        self.map_radius = map_radius
+        if arrays is None:
+            arrays = build(map_radius)
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+
+    def __len__(self):
+        return len(self.coords)
+
+    @property
+    def nbytes(self):
+        """ Memory used by the index arrays, in bytes."""
+        return sum( getattr(self, name).nbytes for name in ARRAYS )
+
+    def cell_id(self, cell):
+        """ Returns the id of a cell given by its axial coordinates."""
+        return int( self.index[cell[0] + self.map_radius, cell[1] + self.map_radius] )
+
+    def cell_ids(self, q, r):
+        """ Returns the ids of the cells given by arrays of q and r
+            coordinates. Cells outside of the map get the id -1.
+        """
+        q = numpy.asarray(q)
+        r = numpy.asarray(r)
+        inside = numpy.maximum( numpy.maximum( abs(q), abs(r) ),
+                                abs(q+r) ) <= self.map_radius
+        ids = numpy.full(q.shape, -1, dtype=numpy.int32)
+        ids[inside] = self.index[q[inside] + self.map_radius,
+                                 r[inside] + self.map_radius]
+        return ids
+
+    def cells_ids(self, cells):
+        """ Returns the ids of an iterable of axial coordinates tuples."""
+        cells = list(cells)
+        q = numpy.fromiter( (c[0] for c in cells), dtype=numpy.int32, count=len(cells) )
+        r = numpy.fromiter( (c[1] for c in cells), dtype=numpy.int32, count=len(cells) )
+        return self.cell_ids(q, r)
+
+    def cell_coord(self, i):
+        """ Returns the axial coordinates of a cell given by its id."""
+        return ( int(self.coords[i, 0]), int(self.coords[i, 1]) )
+
+    def cell_coords(self, ids):
+        """ Returns a list of axial coordinates tuples from an array of ids."""
+        return list( zip( self.coords[ids, 0].tolist(), self.coords[ids, 1].tolist() ) )
+
+    def direct_table(self, missing=-1, ids=None):
+        """ Returns the direct neighbors as an int32 array (size, 6), in
+            hexu.directions order, or only the ones of the given cell ids.
+            Neighbors outside of the map are set to the given missing value.
+        """
+        coords = self.coords if ids is None else self.coords[ids]
+        q = coords[:, 0]
+        r = coords[:, 1]
+        table = numpy.stack( [ self.cell_ids(q + dq, r + dr)
+                               for dq, dr in hexu.directions ], axis=1 )
+        table[table < 0] = missing
+        return table
+
+    def direct(self, i):
+        """ Returns the ids of the direct neighbors of cell i."""
+        return self.direct_indices[ self.direct_offsets[i]:self.direct_offsets[i+1] ]
+
+    def extended(self, i):
+        """ Returns the ids of the second order neighbors of cell i."""
+        return self.extended_indices[ self.extended_offsets[i]:self.extended_offsets[i+1] ]
+
+    def _gather_(self, offsets, indices, ids):
+        starts = offsets[ids]
+        lengths = offsets[ids + 1] - starts
+        rows = numpy.repeat( numpy.arange(len(ids)), lengths )
+        # position of each neighbor inside its own row
+        local = numpy.arange(len(rows)) - numpy.repeat( numpy.cumsum(lengths) - lengths, lengths )
+        return rows, indices[ numpy.repeat(starts, lengths) + local ]
+
+    def direct_of(self, ids):
+        """ Returns the direct neighbors of a set of cells, as two arrays
+            (rows, neighbors): neighbors[k] is a neighbor of ids[rows[k]].
+        """
+        return self._gather_(self.direct_offsets, self.direct_indices, ids)
+
+    def extended_of(self, ids):
+        """ Same as direct_of for the second order neighbors."""
+        return self._gather_(self.extended_offsets, self.extended_indices, ids)
+
+    def neighborhood(self, ids):
+        """ Returns the sorted ids of the given cells together with all
+            their direct and second order neighbors.
+        """
+        # marking the cells of the map is faster than sorting the ids
+        mark = numpy.zeros(len(self.coords), dtype=bool)
+        mark[ids] = True
+        mark[ self.direct_of(ids)[1] ] = True
+        mark[ self.extended_of(ids)[1] ] = True
+        return numpy.flatnonzero(mark).astype(numpy.int32)
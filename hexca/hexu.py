@@ -16,9 +16,15 @@ optimize efficiency (hash, etc.) and provide the maximum speed (namedtuple
 is amazingly slow to allocate because of string transforms, list or numpy
 arrays have also been tested by were much less efficient than the basic tuple).
 
+This holds for a single cell. For many cells at once, the routines named
+after the plural (cells_neighbors, cells_centers, hexagonal_map...) take
+and return numpy arrays of axial coordinates, of shape (N, 2), and cost a
+few array operations whatever the number of cells.
+
 '''
 
 import math
+import numpy
 
 SQRT3 = math.sqrt(3)
 
@@ -39,6 +45,7 @@ directions = [
         (-1, +1),
         (0, +1)
     ]
+DIRECTIONS = numpy.array(directions, dtype=numpy.int32)
         
 def cell_neighbors(cell):
     """ Returns direct neighbors of an hexagonal cell.
@@ -120,3 +127,94 @@ def map_px_size(map_radius, hex_radius):
     """
     return ( 2 * int( math.ceil( (2 * map_radius + 1) * SQRT3 * hex_radius / 2) ),
                                 hex_radius * (2 + 3 * map_radius) )
+
+def cells_array(cells):
+    """ Returns the axial coordinates of cells (an array or a sequence of
+        tuples) as an int array (N, 2).
+    """
+    return numpy.asarray(cells, dtype=numpy.int32).reshape(-1, 2)
+
+def cells_neighbors(cells):
+    """ Returns the direct neighbors of N cells as an array (N, 6, 2), in
+        the order of directions.
+    """
+    return cells_array(cells)[:, numpy.newaxis, :] + DIRECTIONS
+
+def cells_cube_coords(cells):
+    """ Returns the cube coordinates of N cells as an array (N, 3)."""
+    cells = cells_array(cells)
+    return numpy.stack( ( cells[:, 0], -cells[:, 0] - cells[:, 1], cells[:, 1] ), axis=1 )
+
+def cells_distances(c1, c2):
+    """ Returns the distances between the cells of two arrays (N, 2), cell
+        by cell. One of them can be a single cell.
+    """
+    d = numpy.asarray(c1) - numpy.asarray(c2)
+    dq = d[..., 0]
+    dr = d[..., 1]
+    return numpy.maximum( numpy.maximum( abs(dq), abs(dr) ), abs(dq + dr) )
+
+def pairwise_distances(c1, c2):
+    """ Returns the distances between every cell of c1 (N, 2) and every
+        cell of c2 (M, 2), as an array (N, M).
+    """
+    return cells_distances( cells_array(c1)[:, numpy.newaxis, :],
+                            cells_array(c2)[numpy.newaxis, :, :] )
+
+def origin_distances(cells):
+    """ Returns the distances of N cells to the center of the map."""
+    return cells_distances( cells_array(cells), (0, 0) )
+
+def cells_centers(cells):
+    """ Returns the centers of N cells as a float array (N, 2), for unit
+        cells as cell_center.
+    """
+    cells = cells_array(cells)
+    return numpy.stack( ( SQRT3 * (cells[:, 0] + cells[:, 1]/2.0), 3.0/2.0 * cells[:, 1] ),
+                        axis=1 )
+
+def cells_rings(centers, radius):
+    """ Returns the rings of a given radius around N cells as an array
+        (N, 6*radius, 2), each ring in the order of cell_ring.
+    """
+    steps = numpy.repeat(DIRECTIONS, radius, axis=0)
+    # first cell of the ring, then one step at a time
+    offsets = radius * DIRECTIONS[4] + numpy.cumsum(steps, axis=0) - steps
+    return cells_array(centers)[:, numpy.newaxis, :] + offsets
+
+def hexagonal_map(map_radius):
+    """ Returns the cells of an hexagonal map as an array (N, 2), in the
+        order of hexagonal_map_gen.
+    """
+    q, r = numpy.mgrid[-map_radius:map_radius+1, -map_radius:map_radius+1]
+    inside = abs(q + r) <= map_radius
+    return numpy.stack( (q[inside], r[inside]), axis=1 ).astype(numpy.int32)
+
+def round_cells(q, r):
+    """ Returns the cells (N, 2) containing fractional axial coordinates,
+        rounded in cube coordinates.
+    """
+    q = numpy.asarray(q, dtype=float)
+    r = numpy.asarray(r, dtype=float)
+    s = -q - r
+    rq = numpy.round(q)
+    rr = numpy.round(r)
+    rs = numpy.round(s)
+    dq = abs(rq - q)
+    dr = abs(rr - r)
+    ds = abs(rs - s)
+    # the coordinate rounded the most is recomputed from the two others
+    fix_q = ( dq > dr ) & ( dq > ds )
+    fix_r = ~fix_q & ( dr > ds )
+    rq = numpy.where(fix_q, -rr - rs, rq)
+    rr = numpy.where(fix_r, -rq - rs, rr)
+    return numpy.stack( (rq, rr), axis=-1 ).astype(numpy.int32).reshape(-1, 2)
+
+def pixels_to_cells(points, hex_radius, origin=(0, 0)):
+    """ Returns the cells (N, 2) under N pixels (N, 2), for cells of
+        radius 'hex_radius' and the cell (0, 0) centered on origin.
+    """
+    points = numpy.asarray(points, dtype=float).reshape(-1, 2) - origin
+    x = points[:, 0] / hex_radius
+    y = points[:, 1] / hex_radius
+    return round_cells( SQRT3/3.0 * x - 1.0/3.0 * y, 2.0/3.0 * y )
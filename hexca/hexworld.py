@@ -1,5 +1,67 @@
+import collections.abc
 import random
+import numpy
 import hexu
+import hexarray
+import hexbits
+import hashlife
+import hexhash
+import hexparallel
+import hexdelta
+import hexkernel
+import hexactivity
+import hexmetrics
+import hexseed
+import hextopo
+
+# Engines available in addition to the default 'set' one
+ENGINES = {
+        'array': hexarray.ArrayEngine,
+        'bitboard': hexbits.BitboardEngine,
+        'hashlife': hashlife.HashlifeEngine,
+        'tiled': hexparallel.TiledEngine,
+        'delta': hexdelta.DeltaEngine,
+        'kernel': hexkernel.KernelEngine,
+        'activity': hexactivity.ActivityEngine
+    }
+
+class CellColors(collections.abc.MutableMapping):
+    """ Colors of the cells alive of an HexWorld, as a mapping of
+        (q, r) -> (hue, intensity) read from and written to the hue and
+        intensity arrays of the world. Its keys are the world cells.
+    """
+    def __init__(self, world):
+        self.world = world
+
+    def _id_(self, cell):
+        i = int( self.world.topology.cell_ids(cell[0], cell[1]) )
+        if i < 0:
+            raise KeyError(cell)
+        return i
+
+    def __getitem__(self, cell):
+        if cell not in self.world.cells:
+            raise KeyError(cell)
+        i = self._id_(cell)
+        return ( int(self.world.hue[i]), int(self.world.intensity[i]) )
+
+    def __setitem__(self, cell, color):
+        i = self._id_(cell)
+        self.world.hue[i], self.world.intensity[i] = color
+
+    def __delitem__(self, cell):
+        i = self._id_(cell)
+        self.world.hue[i] = 0
+        self.world.intensity[i] = 0
+
+    def __contains__(self, cell):
+        return cell in self.world.cells
+
+    def __iter__(self):
+        return iter(self.world.cells)
+
+    def __len__(self):
+        return len(self.world.cells)
 
 class HexWorld:
     """
@@ -10,139 +72,429 @@ class HexWorld:
         The data structures used are:
           - tuple(q, r) : Axial Coordinates (refered simply as (q,r) later)
           - cells = set( (q,r), ... ) : current cells alive
-          - neighbors = { key = (q,r) : value = (
-                set( (q,r), ... ) = direct neighbors 
-                set( (q,r), ... ) = second order neighbors
-                ) }
-          - colors = { key=(q,r) : value = (hue, saturation) }
-          - potential_population = set( (q,r), ... ) : cells to consider at
-            next cycle
+          - topology = hextopo.HexTopology : cell ids and neighbors index
+          - alive = uint8 array indexed by cell id : 1 for the cells alive,
+            state of the set engine only, reloaded from cells when they
+            are replaced (see _sync_): the other engines keep their own
+            state and do not update it
+          - hue = int16 array, intensity = uint8 array indexed by cell
+            id : colors of the cells alive, 0 for the other ones
+          - colors = CellColors : { key=(q,r) : value = (hue, saturation) }
+            view of the hue and intensity arrays. Assigning a dictionary
+            to it replaces all the colors
+          - potential_population = array( id, ... ) : sorted ids of the
+            cells to consider at next cycle, with the set engine only
+          - births, deaths = array( id, ... ) : cells born and dead during
+            the last evolution, set by every engine
+          - metrics = hexmetrics.Metrics : per generation metrics, None
+            unless enabled with instrument
+
+        The evolution itself is performed by an engine selected at
+        construction time:
+          - 'set' : only the potential population is considered at each
+            cycle, using the neighbors index (default)
+          - 'array' : masked 2D axial array, see hexarray.ArrayEngine
+          - 'bitboard' : bit-packed axial grid, see hexbits.BitboardEngine
+          - 'hashlife' : memoized quadtree, see hashlife.HashlifeEngine
+          - 'tiled' : worker processes stepping axial tiles of the array
+            engine, see hexparallel.TiledEngine
+          - 'delta' : neighbors counts updated with the cells born and
+            dead, see hexdelta.DeltaEngine
+          - 'kernel' : array engine counting the neighbors with weighted
+            rings of any radius, see hexkernel.KernelEngine
+          - 'activity' : delta engine counting the births and deaths of
+            axial tiles, see hexactivity.ActivityEngine
+        Additional keyword arguments are given to the engine, for example
+        HexWorld(300, 'tiled', workers=8).
+
+        When a cache_dir is given, the neighbors index is memory-mapped
+        from it (and stored there the first time), see hextopo.load.
     """
-    def __init__(self, map_radius):
+    def __init__(self, map_radius, engine='set', cache_dir=None, **engine_options):
         self.map_radius = map_radius
         self.rules_environment = { 2, 3 }
         self.rules_fertility = { 2 }
         self.cells = set()
-        self.colors = {}
         self.cycles = 0
         self.use_extended_neighbors = True
         self.extended_neighbors_factor = 3
-        self.potential_population = set()
-        
-        # Dictionary indexed by cell coordinate and pointing to a tuple
-        # of two sets (direct_neighbors, extended_neighbors)
-        self.neighbors = {}
+        self.potential_population = numpy.zeros(0, dtype=numpy.int32)
+        self.births = numpy.zeros(0, dtype=numpy.int32)
+        self.deaths = numpy.zeros(0, dtype=numpy.int32)
+
+        # Periodic states detection, see track_cycles
+        self.cycle_detector = None
+        self.stop_on_cycle = False
+        self.hashed_cells = None
+        self.hashed_rules = None
+
+        # Per generation metrics, see instrument
+        self.metrics = None
         
-        # Compute every cell neighbors in advance (minus the periphery)
-        for c in hexu.hexagonal_map_gen(map_radius):
-            direct_neighbors = set()
-            extended_neighbors = set()
-            for n in hexu.cell_neighbors(c):
-                if hexu.cells_distance((0,0), n) <= map_radius:
-                    direct_neighbors.add(n)
-            for n in hexu.cell_ring(c, 2):
-                if hexu.cells_distance((0,0), n) <= map_radius:
-                    extended_neighbors.add(n)
-            self.neighbors[c] = (direct_neighbors, extended_neighbors)
+        # Compact neighbor index of the whole map (minus the periphery)
+        self.topology = hextopo.load(map_radius, cache_dir)
+
+        # Alive state indexed by cell id, kept in sync with cells
+        self.alive = numpy.zeros(len(self.topology), dtype=numpy.uint8)
+        self.published_cells = self.cells
+
+        # Colors indexed by cell id
+        self.hue = numpy.zeros(len(self.topology), dtype=numpy.int16)
+        self.intensity = numpy.zeros(len(self.topology), dtype=numpy.uint8)
 
         # Define a non linear color intensity
         #self.intensities = [i for i in range(80, 35, -5)]
         #self.intensities.insert(0, 100)
+
+        if engine == 'set':
+            if engine_options:
+                raise TypeError('the set engine takes no options')
+            self.engine = None
+        elif engine in ENGINES:
+            self.engine = ENGINES[engine](self, **engine_options)
+        else:
+            raise ValueError('unknown engine: %r' % engine)
         
     def __len__(self):
-        return len(self.neighbors)
+        return len(self.topology)
+
+    @property
+    def colors(self):
+        return CellColors(self)
+
+    @colors.setter
+    def colors(self, colors):
+        if isinstance(colors, CellColors) and colors.world is self:
+            return
+        colors = dict(colors)
+        self.hue.fill(0)
+        self.intensity.fill(0)
+        if colors:
+            ids = self.topology.cells_ids( colors.keys() )
+            values = numpy.array( list( colors.values() ) ).reshape(-1, 2)
+            self.hue[ids] = values[:, 0]
+            self.intensity[ids] = values[:, 1]
 
     def set_rules(self, environement, fertility):
         self.rules_environment = environement
         self.rules_fertility = fertility
         
     def clear(self):
-        self.cells.clear()
-        self.potential_population.clear()
+        self.cells = set()
+        self.alive.fill(0)
+        self.hue.fill(0)
+        self.intensity.fill(0)
+        self.published_cells = self.cells
+        self.potential_population = numpy.zeros(0, dtype=numpy.int32)
         self.cycles = 0
-        
-    def random(self, density, initial_radius):
+
+    def _populate_(self, ids):
+        """ Set the cells alive from an array of ids. Colors are left to
+            the caller.
+        """
+        ids = numpy.asarray(ids, dtype=numpy.int32)
+        self.alive.fill(0)
+        self.alive[ids] = 1
+        self.cells = set( self.topology.cell_coords(ids) )
+        self.published_cells = self.cells
+        self.potential_population = self.topology.neighborhood(ids)
+
+    def _sync_(self):
+        """ Reload the alive state if the cells have been replaced."""
+        if self.cells is not self.published_cells:
+            self._populate_( self.topology.cells_ids(self.cells) )
+
+    def seed(self, cells, hue=None, intensity=100, rng=None):
+        """ Set cells alive in addition to the current ones. cells is an
+            array (N, 2) of axial coordinates, such as the hexseed shapes,
+            the ones outside of the map are ignored. hue and intensity are
+            single values or arrays of N values, hue being drawn from
+            hexseed.HUES with rng when missing.
+        """
+        cells = hexu.cells_array(cells)
+        if hue is None:
+            hue = hexseed.hues( len(cells), hexseed.generator(rng) )
+        hue = numpy.broadcast_to(hue, len(cells))
+        intensity = numpy.broadcast_to(intensity, len(cells))
+        ids = self.topology.cell_ids(cells[:, 0], cells[:, 1])
+        inside = ids >= 0
+        ids = ids[inside]
+        self.hue[ids] = hue[inside]
+        self.intensity[ids] = intensity[inside]
+        alive = numpy.zeros(len(self.topology), dtype=bool)
+        alive[ self.topology.cells_ids(self.cells) ] = True
+        alive[ids] = True
+        self._populate_( numpy.flatnonzero(alive) )
+
+    def random(self, density, initial_radius, rng=None):
+        """ Seeds the cells within initial_radius of the center with a
+            given density. With a numpy Generator or a seed as rng, the
+            cells are drawn in bulk with hexseed, each with a probability
+            density. Otherwise exactly density of them are drawn with the
+            random module.
+        """
         self.clear()
-        if initial_radius < self.map_radius:
-            potential_cells = [c for c in hexu.hexagonal_map_gen(initial_radius) ]
-            self.cells = set( random.sample( potential_cells,
-                                k = int( density * len(potential_cells) ) ) )
-            for c in self.cells:
-                self.colors[c] = random.choice( [(60,100), (60,100), (60,100), (60,100), (180,100), (300,100)] )
-                self.potential_population.add(c)
-                self.potential_population.update(self.neighbors[c][0] | self.neighbors[c][1])
+        if initial_radius < self.map_radius and rng is not None:
+            rng = hexseed.generator(rng)
+            self.seed( hexseed.select( hexseed.hexagon(initial_radius), density, rng ), rng=rng )
+        elif initial_radius < self.map_radius:
+            # ids follow the hexagonal_map_gen order, so do the selected ones
+            distance = hexu.origin_distances(self.topology.coords)
+            potential_cells = numpy.flatnonzero(distance <= initial_radius).tolist()
+            ids = random.sample( potential_cells,
+                                 k = int( density * len(potential_cells) ) )
+            self._populate_(ids)
+            self.hue[ids] = [ random.choice( [60, 60, 60, 60, 180, 300] ) for i in ids ]
+            self.intensity[ids] = 100
         else:
             raise ValueError('initial_radius is larger than map_radius')
     
-    def cluster(self, number, seed_radius, density):
+    def cluster(self, number, seed_radius, density, rng=None):
+        """ Seeds a number of hexagonal clusters of about seed_radius with
+            a given density. With a numpy Generator or a seed as rng, they
+            are drawn in bulk with hexseed.clusters, otherwise with the
+            random module.
+        """
         self.clear()
         radius_variation = seed_radius // 2
         max_radius = self.map_radius - seed_radius - radius_variation
-        center_choices = [c for c in hexu.hexagonal_map_gen(max_radius)]
+        if rng is not None:
+            if not radius_variation < seed_radius < max_radius:
+                raise ValueError('invalid seed radius')
+            cells, hue = hexseed.clusters( number, seed_radius, density, max_radius,
+                                           hexseed.generator(rng) )
+            self.seed(cells, hue)
+            return
+        center_choices = hexu.hexagonal_map(max_radius)
         if  radius_variation < seed_radius and seed_radius < max_radius:
+            selected = []
             for i in range(0, number):
                 color = random.choice([(60,100), (180, 100), (300,100)])                
                 radius = seed_radius + random.randint(-radius_variation, radius_variation)
                 center = random.choice(center_choices)
-                potential_cells = [hexu.cells_add(center, c) 
-                                    for c in hexu.hexagonal_map_gen(radius) ]
-                selected_cells = set( random.sample( potential_cells,
-                                    k = int( density * len(potential_cells) ) ) )
-                self.cells.update(selected_cells)
-                for c in selected_cells:
-                    self.colors[c] = color
-            for c in self.cells:
-                self.potential_population.add(c)
-                self.potential_population.update(self.neighbors[c][0] | self.neighbors[c][1])
+                shape = hexu.hexagonal_map(radius)
+                potential_cells = self.topology.cell_ids( shape[:, 0] + center[0],
+                                                          shape[:, 1] + center[1] ).tolist()
+                selected_cells = random.sample( potential_cells,
+                                    k = int( density * len(potential_cells) ) )
+                selected.extend(selected_cells)
+                self.hue[selected_cells] = color[0]
+                self.intensity[selected_cells] = color[1]
+            self._populate_( numpy.unique( numpy.array(selected, dtype=numpy.int32) ) )
         else:
             raise ValueError('invalid seed radius')
     
 
 
-    def _update_color_(self, cell, colormap):
-        intensity = self.colors[cell][1]
-        if intensity == 100:
-            intensity = 70
-        elif intensity > 25:
-            intensity -= 5
-        colormap[cell] = (self.colors[cell][0], intensity)
-        
-    def _select_color_(self, cell, colormap):
-        hue = 0
-        count = 0
-        for n in self.neighbors[cell][0]:
-            # only use the two first parents
-            if count == 2:
-                break
-            if n in self.cells:
-                hue += self.colors[n][0]
-                count += 1
-        hue = ( hue // count ) % 360
-        colormap[cell] = (hue, 100)
+    def _parents_hue_(self, births):
+        """ Returns the hue of newborn cells, see hexarray.parents_hue."""
+        return hexarray.parents_hue( self.alive, self.hue,
+                                     self.topology.direct_table(ids=births) )
+
+    def track_cycles(self, history=256, stop=False):
+        """ Enable the detection of periodic states.
+
+            The world is hashed incrementally at each evolution, and the
+            hashes of the last 'history' generations are kept. Once the
+            world comes back to one of them, period() reports the period
+            and the generation the cycle started at. With stop, evolve
+            and advance then do nothing anymore.
+
+            Worlds advanced by jumps of several generations are only
+            hashed after each jump, the period is then a multiple of it.
+            Replacing the cells or modifying the rules starts the detection
+            again.
+        """
+        self.cycle_detector = hexhash.CycleDetector(len(self.topology), history)
+        self.stop_on_cycle = stop
+        self.hashed_cells = None
+        self.hashed_rules = None
+
+    def instrument(self, capacity=1024, sinks=()):
+        """ Enable the per generation metrics, see hexmetrics, and returns
+            the hexmetrics.Metrics recording them. Set metrics to None to
+            disable them.
+        """
+        self.metrics = hexmetrics.Metrics(capacity, sinks)
+        return self.metrics
+
+    def period(self):
+        """ Returns (period, generation) of the cycle the world entered,
+            or None if no cycle has been detected (or tracked).
+        """
+        detector = self.cycle_detector
+        if detector is None or detector.period is None:
+            return None
+        if self._rules_key_() != self.hashed_rules:
+            # the cycle was found with other rules
+            return None
+        return ( detector.period, detector.start )
+
+    def _rules_key_(self):
+        """ Returns a copy of everything the evolution of the cells
+            depends on, besides the cells.
+        """
+        return ( frozenset(self.rules_environment), frozenset(self.rules_fertility),
+                 self.use_extended_neighbors, self.extended_neighbors_factor )
+
+    def _hash_cells_(self):
+        """ Hash the cells from scratch if they have been replaced, or if
+            the rules have been modified, since the last evolution. Returns
+            False if the world should stop.
+        """
+        detector = self.cycle_detector
+        rules = self._rules_key_()
+        if self.cells is not self.hashed_cells or rules != self.hashed_rules:
+            detector.reset( self.topology.cells_ids(self.cells), self.cycles )
+            self.hashed_rules = rules
+        return not ( self.stop_on_cycle and detector.period is not None )
 
     def evolve(self):
-        next_generation = set()
-        next_candidates = set()
-        next_colors = {}
-        # for c in hexu.hexagonal_map_gen(self.map_radius-1):
-        for c in self.potential_population:
-            alive_neighbors = len( self.neighbors[c][0].intersection(self.cells) )
-            if self.use_extended_neighbors:
-                alive_neighbors += len( 
-                    self.neighbors[c][0].intersection(self.cells) ) // self.extended_neighbors_factor
-            if c in self.cells:
-                if alive_neighbors in self.rules_environment:
-                    next_generation.add(c)
-                    self._update_color_(c, next_colors)
-                    next_candidates.add(c)
-                    next_candidates.update(self.neighbors[c][0] | self.neighbors[c][1])
-            else:
-                if alive_neighbors in self.rules_fertility:
-                    next_generation.add(c)
-                    self._select_color_(c, next_colors)
-                    next_candidates.add(c)
-                    next_candidates.update(self.neighbors[c][0] | self.neighbors[c][1])
-        self.cells = next_generation
-        self.colors = next_colors
-        self.potential_population = next_candidates
+        detector = self.cycle_detector
+        if detector is not None and not self._hash_cells_():
+            return
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.begin()
+        if self.engine is not None:
+            self.engine.evolve()
+        else:
+            self._evolve_()
         self.cycles += 1
+        if detector is not None:
+            detector.update(self.births, self.deaths, self.cycles)
+            self.hashed_cells = self.cells
+        if metrics is not None:
+            metrics.end(self)
+
+    def _next_(self):
+        """ Returns the (survivors, births, deaths) ids of the next
+            generation of the set engine, from the alive array.
+        """
+        candidates = self.potential_population
+        rows, neighbors = self.topology.direct_of(candidates)
+        alive_neighbors = numpy.bincount( rows, weights=self.alive[neighbors],
+                                          minlength=len(candidates) ).astype(numpy.intp)
+        if self.use_extended_neighbors:
+            alive_neighbors += alive_neighbors // self.extended_neighbors_factor
+        environment, fertility = hexarray.rule_tables(self)
+
+        was_alive = self.alive[candidates] == 1
+        survivors = candidates[ was_alive & environment[alive_neighbors] ]
+        births = candidates[ ~was_alive & fertility[alive_neighbors] ]
+        deaths = candidates[ was_alive & ~environment[alive_neighbors] ]
+        return survivors, births, deaths
+
+    def _evolve_(self):
+        """ Evolution of the set engine."""
+        metrics = self.metrics
+        self._sync_()
+        if metrics is not None:
+            metrics.mark('rebuild')
+        topology = self.topology
+        survivors, births, deaths = self._next_()
+        self.births = births
+        self.deaths = deaths
+        if metrics is not None:
+            metrics.mark('count')
+
+        # survivors fade, newborns get the hue of their parents
+        birth_hue = self._parents_hue_(births)
+        self.intensity[survivors] = hexarray.fade( self.intensity[survivors] )
+        self.hue[deaths] = 0
+        self.intensity[deaths] = 0
+        self.hue[births] = birth_hue
+        self.intensity[births] = 100
+        if metrics is not None:
+            metrics.mark('color')
+
+        next_generation = numpy.concatenate( (survivors, births) )
+        self.alive[deaths] = 0
+        self.alive[births] = 1
+        self.cells = set( topology.cell_coords(next_generation) )
+        self.published_cells = self.cells
+        self.potential_population = topology.neighborhood(next_generation)
+        if metrics is not None:
+            metrics.mark('rebuild')
+
+    def _advance_(self, generations):
+        """ Fused evolution of the set engine over several generations.
+
+            Only the alive array and the hue of the newborns are updated at
+            each generation. The cells set and the intensities, which only
+            depend on the age of the cells, are computed once at the end.
+            Births and deaths are the cells changed by the whole jump.
+        """
+        self._sync_()
+        topology = self.topology
+        previous = self.alive.copy()
+        # generation each cell was last born at during the jump, or -1
+        born_at = numpy.full(len(topology), -1, dtype=numpy.int32)
+        for g in range(0, generations):
+            survivors, births, deaths = self._next_()
+            self.hue[births] = self._parents_hue_(births)
+            born_at[births] = g
+            self.alive[deaths] = 0
+            self.alive[births] = 1
+            self.potential_population = topology.neighborhood(
+                                            numpy.concatenate( (survivors, births) ) )
+
+        ids = numpy.flatnonzero(self.alive)
+        newborn = born_at[ids] >= 0
+        times = numpy.where(newborn, generations - 1 - born_at[ids], generations)
+        intensity = hexarray.faded( numpy.where(newborn, 100, self.intensity[ids]), times )
+        self.births = numpy.flatnonzero(self.alive > previous)
+        self.deaths = numpy.flatnonzero(self.alive < previous)
+        # cells dead at the end but alive at some point of the jump
+        dead = numpy.flatnonzero( ( self.alive == 0 ) & ( ( previous == 1 ) | ( born_at >= 0 ) ) )
+        self.hue[dead] = 0
+        self.intensity[dead] = 0
+        self.intensity[ids] = intensity
+        self.cells = set( topology.cell_coords(ids) )
+        self.published_cells = self.cells
+
+    def advance(self, generations):
+        """ Evolve the world by the given number of generations, only
+            materializing the last one. The set, array, kernel, bitboard
+            and tiled engines run the generations in a single loop over
+            their arrays and skip the intensities in between, hashlife
+            jumps over them, the delta and activity engines
+            simply evolve repeatedly.
+        """
+        if generations == 1 or not ( self.engine is None or hasattr(self.engine, 'advance') ):
+            for i in range(0, generations):
+                self.evolve()
+                if self.stop_on_cycle and self.period() is not None:
+                    break
+            return
+        detector = self.cycle_detector
+        if detector is not None and not self._hash_cells_():
+            return
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.begin()
+        if self.engine is not None:
+            self.engine.advance(generations)
+        else:
+            self._advance_(generations)
+        self.cycles += generations
+        if detector is not None:
+            detector.update(self.births, self.deaths, self.cycles)
+            self.hashed_cells = self.cells
+        if metrics is not None:
+            metrics.end(self)
+
+    def advance_until(self, predicate, limit, every=1):
+        """ Advance the world by jumps of 'every' generations until
+            predicate(world) is true, or until 'limit' generations have
+            been evolved. The predicate is only checked after each jump.
+            Returns the number of generations evolved.
+        """
+        start = self.cycles
+        while self.cycles - start < limit and not predicate(self):
+            cycles = self.cycles
+            self.advance( min( every, limit - (self.cycles - start) ) )
+            if self.cycles == cycles:
+                # stopped on a cycle
+                break
+        return self.cycles - start
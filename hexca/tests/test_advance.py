@@ -0,0 +1,69 @@
+import pytest
+import hexworld
+
+RADIUS = 25
+
+def seeded_world(engine, use_extended_neighbors, seed=1):
+    world = hexworld.HexWorld(RADIUS, engine)
+    world.use_extended_neighbors = use_extended_neighbors
+    world.random(0.5, 15, rng=seed)
+    return world
+
+def close(*worlds):
+    for world in worlds:
+        if hasattr(world.engine, 'close'):
+            world.engine.close()
+
+@pytest.mark.parametrize('use_extended_neighbors', [False, True])
+@pytest.mark.parametrize('engine', ['set'] + sorted(hexworld.ENGINES))
+def test_advance_matches_evolve(engine, use_extended_neighbors):
+    looped = seeded_world(engine, use_extended_neighbors)
+    jumped = seeded_world(engine, use_extended_neighbors)
+    for generations in ( 1, 2, 7, 30 ):
+        before = set(jumped.cells)
+        for i in range(0, generations):
+            looped.evolve()
+        jumped.advance(generations)
+        assert jumped.cycles == looped.cycles
+        assert jumped.cells == looped.cells
+        # hashlife does not track the colors of the cells
+        if engine != 'hashlife':
+            assert dict(jumped.colors) == dict(looped.colors)
+        # the delta engines evolve repeatedly, with the births and deaths
+        # of the last generation
+        if engine not in ( 'delta', 'activity' ):
+            topology = jumped.topology
+            assert set( topology.cell_coords(jumped.births) ) == jumped.cells - before
+            assert set( topology.cell_coords(jumped.deaths) ) == before - jumped.cells
+    close(looped, jumped)
+
+def test_advance_until():
+    world = seeded_world('set', True, seed=3)
+    reference = seeded_world('set', True, seed=3)
+    predicate = lambda w: len(w.cells) > 400
+    evolved = world.advance_until(predicate, 500, every=10)
+    assert evolved == world.cycles
+    assert evolved % 10 == 0 and evolved < 500
+    for i in range(0, evolved):
+        reference.evolve()
+    assert world.cells == reference.cells
+    assert dict(world.colors) == dict(reference.colors)
+    assert predicate(world)
+    # the predicate is checked after each jump only
+    reference = seeded_world('set', True, seed=3)
+    reference.advance(evolved - 10)
+    assert not predicate(reference)
+
+def test_advance_until_limit():
+    world = seeded_world('array', False)
+    assert world.advance_until(lambda w: False, 25, every=10) == 25
+    assert world.cycles == 25
+
+def test_advance_until_stops_on_cycle():
+    world = hexworld.HexWorld(15)
+    world.set_rules({3, 4, 5}, {3, 4})
+    world.random(0.5, 10, rng=2)
+    world.track_cycles(stop=True)
+    evolved = world.advance_until(lambda w: False, 1000, every=7)
+    assert evolved < 1000
+    assert world.period() is not None
@@ -0,0 +1,90 @@
+import os
+import struct
+import pytest
+import hexcheckpoint
+import hexworld
+
+RADIUS = 20
+
+def seeded_world():
+    world = hexworld.HexWorld(RADIUS)
+    world.set_rules({3, 4, 5}, {3, 4})
+    world.random(0.5, RADIUS // 2, rng=3)
+    return world
+
+def state(world):
+    return ( world.cycles, set(world.cells), dict(world.colors) )
+
+def write_run(path, world, snapshots):
+    writer = hexcheckpoint.CheckpointWriter(path, world.map_radius)
+    states = []
+    for i in range(0, snapshots):
+        world.evolve()
+        writer.write(world)
+        states.append( state(world) )
+    return states
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'run.hexca')
+    world = seeded_world()
+    world.use_extended_neighbors = True
+    states = write_run(path, world, 3)
+    checkpoint = hexcheckpoint.Checkpoint(path)
+    assert len(checkpoint) == 3
+    for index, expected in enumerate(states):
+        for engine in ('set', 'delta'):
+            loaded = checkpoint.load(index, engine)
+            assert state(loaded) == expected
+            assert loaded.rules_environment == {3, 4, 5}
+            assert loaded.rules_fertility == {3, 4}
+            assert loaded.use_extended_neighbors
+    # the world evolves the same from its checkpoint
+    loaded = checkpoint.load(-1)
+    world.evolve()
+    loaded.evolve()
+    assert state(loaded) == state(world)
+
+def test_large_rule_counts(tmp_path):
+    path = str(tmp_path / 'kernel.hexca')
+    world = hexworld.HexWorld(RADIUS, 'kernel', weights=(0, 1, 1, 1))
+    world.set_rules(set(range(20, 35)), {20, 300})
+    world.random(0.5, RADIUS // 2, rng=1)
+    hexcheckpoint.save(world, path)
+    snapshot = hexcheckpoint.Checkpoint(path)[0]
+    assert snapshot.rules_environment == set(range(20, 35))
+    assert snapshot.rules_fertility == {20, 300}
+
+def test_version_check(tmp_path):
+    path = str(tmp_path / 'run.hexca')
+    world = seeded_world()
+    hexcheckpoint.save(world, path)
+    with open(path, 'r+b') as f:
+        f.seek(6)
+        f.write( struct.pack('<H', hexcheckpoint.VERSION + 1) )
+    with pytest.raises(ValueError):
+        hexcheckpoint.Checkpoint(path)
+    with pytest.raises(ValueError):
+        hexcheckpoint.CheckpointWriter(path, RADIUS)
+
+def test_radius_check(tmp_path):
+    path = str(tmp_path / 'run.hexca')
+    hexcheckpoint.save(seeded_world(), path)
+    with pytest.raises(ValueError):
+        hexcheckpoint.CheckpointWriter(path, RADIUS + 1)
+
+def test_torn_snapshot(tmp_path):
+    path = str(tmp_path / 'run.hexca')
+    world = seeded_world()
+    states = write_run(path, world, 2)
+    complete = os.path.getsize(path)
+    # a run interrupted while writing its third snapshot
+    world.evolve()
+    with open(path, 'ab') as f:
+        f.write( hexcheckpoint.encode(world)[:-20] )
+    assert len( hexcheckpoint.Checkpoint(path) ) == 2
+    # appending first removes the partial snapshot
+    states += write_run(path, world, 2)
+    assert os.path.getsize(path) > complete
+    checkpoint = hexcheckpoint.Checkpoint(path)
+    assert len(checkpoint) == 4
+    assert [ state( checkpoint.load(i) ) for i in range(0, 4) ] == states
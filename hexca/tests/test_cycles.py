@@ -0,0 +1,67 @@
+import hexworld
+
+def tracked_world(seed, stop=False):
+    world = hexworld.HexWorld(15)
+    world.set_rules({3, 4, 5}, {3, 4})
+    world.random(0.5, 10, rng=seed)
+    world.track_cycles(stop=stop)
+    return world
+
+def evolve_to_cycle(world, limit=300):
+    """ Evolves until a cycle is detected, returns the cells of every
+        generation.
+    """
+    states = { world.cycles: frozenset(world.cells) }
+    while world.period() is None and world.cycles < limit:
+        world.evolve()
+        states[world.cycles] = frozenset(world.cells)
+    return states
+
+def test_period():
+    for seed in ( 1, 2, 6, 7 ):
+        world = tracked_world(seed)
+        states = evolve_to_cycle(world)
+        assert world.period() is not None
+        period, start = world.period()
+        assert states[world.cycles] == states[world.cycles - period]
+        assert states[start] == states[start + period]
+        # the cycle is entered at start, not before, with no shorter period
+        if start - 1 in states:
+            assert states[start - 1] != states[start - 1 + period]
+        for shorter in range(1, period):
+            assert states[world.cycles] != states[world.cycles - shorter]
+
+def test_oscillator_period():
+    world = tracked_world(2)
+    evolve_to_cycle(world)
+    assert world.period()[0] == 2
+
+def test_stop_on_cycle():
+    world = tracked_world(2, stop=True)
+    evolve_to_cycle(world)
+    cycles = world.cycles
+    cells = set(world.cells)
+    world.evolve()
+    world.advance(10)
+    assert world.cycles == cycles and world.cells == cells
+
+def test_rules_change_restarts_detection():
+    world = tracked_world(2)
+    evolve_to_cycle(world)
+    world.set_rules({2, 3}, {2})
+    assert world.period() is None
+    world.evolve()
+    assert world.period() is None
+
+def test_extended_neighbors_change_restarts_detection():
+    world = tracked_world(2)
+    evolve_to_cycle(world)
+    world.use_extended_neighbors = not world.use_extended_neighbors
+    assert world.period() is None
+
+def test_cells_replaced():
+    world = tracked_world(2)
+    evolve_to_cycle(world)
+    world.random(0.5, 10, rng=3)
+    world.evolve()
+    assert world.period() is None
@@ -0,0 +1,43 @@
+import random
+import pytest
+import hexworld
+
+RADIUS = 30
+GENERATIONS = 40
+
+def seeded_world(engine, use_extended_neighbors):
+    """ Returns a world of the given engine, seeded like all the others."""
+    world = hexworld.HexWorld(RADIUS, engine)
+    world.set_rules({2, 3}, {2})
+    world.use_extended_neighbors = use_extended_neighbors
+    random.seed(1)
+    world.random(0.5, RADIUS // 2)
+    return world
+
+@pytest.mark.parametrize('use_extended_neighbors', [False, True])
+@pytest.mark.parametrize('engine', sorted(hexworld.ENGINES))
+def test_engine_matches_set(engine, use_extended_neighbors):
+    reference = seeded_world('set', use_extended_neighbors)
+    world = seeded_world(engine, use_extended_neighbors)
+    assert world.cells == reference.cells
+    for generation in range(0, GENERATIONS):
+        reference.evolve()
+        world.evolve()
+        assert world.cells == reference.cells, 'generation %d' % generation
+        # hashlife does not track the colors of the cells
+        if engine != 'hashlife':
+            assert dict(world.colors) == dict(reference.colors), 'generation %d' % generation
+
+def test_tiled_engine_restarts_after_close():
+    reference = seeded_world('set', True)
+    world = hexworld.HexWorld(RADIUS, 'tiled', workers=2)
+    world.set_rules({2, 3}, {2})
+    random.seed(1)
+    world.random(0.5, RADIUS // 2)
+    for generation in range(0, 4):
+        world.engine.close()
+        reference.evolve()
+        world.evolve()
+        assert world.cells == reference.cells
+        assert dict(world.colors) == dict(reference.colors)
+    world.engine.close()
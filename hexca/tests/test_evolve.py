@@ -4,13 +4,14 @@ import hexworld
 
 def main():
     if len(sys.argv[1:]) < 2:
-        print("Usage: test_evolve map_radus number_of_cycles")
+        print("Usage: test_evolve map_radus number_of_cycles [engine]")
         sys.exit(1)
 
     radius = int(sys.argv[1])
     loops = int(sys.argv[2])
+    engine = sys.argv[3] if len(sys.argv) > 3 else 'set'
 
-    world = hexworld.HexWorld(radius)
+    world = hexworld.HexWorld(radius, engine)
     density = 0.75
     world.rules_environment = {2, 3}
     world.rules_fertility = {2}
@@ -0,0 +1,92 @@
+import socket
+import threading
+import zlib
+import numpy
+import hexstream
+import hexworld
+
+def apply(state, data):
+    """ Applies the bytes of a frame to a stream state, returns its kind."""
+    kind, cycles, size = hexstream.FRAME.unpack_from(data)
+    assert len(data) == hexstream.FRAME.size + size
+    state.apply( kind, cycles, data[hexstream.FRAME.size:] )
+    return kind
+
+def assert_same(state, world):
+    assert state.cycles == world.cycles
+    assert numpy.array_equal(state.hue, world.hue)
+    assert numpy.array_equal(state.intensity, world.intensity)
+    assert state.population == len(world.cells)
+
+def serve_frames(frames):
+    """ Listens on a local port, sends the frames to the first client and
+        keeps the connection open. Returns the port.
+    """
+    listener = socket.create_server( ('localhost', 0) )
+    def run():
+        connection, address = listener.accept()
+        connection.sendall( b''.join(frames) )
+        # wait for the client to hang up
+        connection.recv(1)
+        connection.close()
+        listener.close()
+    threading.Thread(target=run, daemon=True).start()
+    return listener.getsockname()[1]
+
+def test_corrupt_frame_disconnects():
+    world = hexworld.HexWorld(10)
+    encoder = hexstream.StreamEncoder(world)
+    for payload in ( b'not zlib', zlib.compress(b'short') ):
+        port = serve_frames( [ encoder.hello(), hexstream.frame(hexstream.KEYFRAME, 0, payload) ] )
+        client = hexstream.StreamClient('localhost', port)
+        client.start()
+        client.thread.join(5)
+        assert not client.thread.is_alive()
+        assert client.closed
+
+def test_parse_rule():
+    assert hexstream.parse_rule('2,3') == {2, 3}
+    assert hexstream.parse_rule('2, 10,11') == {2, 10, 11}
+    assert hexstream.parse_rule('') == set()
+
+def test_keyframe():
+    world = hexworld.HexWorld(20)
+    world.set_rules({2, 3, 12}, {2})
+    world.random(0.5, 15, rng=1)
+    world.evolve()
+    state = hexstream.StreamState(20)
+    assert apply( state, hexstream.StreamEncoder(world).keyframe() ) == hexstream.KEYFRAME
+    assert_same(state, world)
+    assert state.rules_environment == {2, 3, 12}
+    assert state.rules_fertility == {2}
+    assert state.use_extended_neighbors == world.use_extended_neighbors
+
+def test_deltas():
+    world = hexworld.HexWorld(20)
+    # a growing world settling down, with a few changes per generation
+    world.set_rules({1, 2, 3, 4, 5, 6}, {5})
+    world.random(0.5, 15, rng=2)
+    encoder = hexstream.StreamEncoder(world)
+    state = hexstream.StreamState(20)
+    # deltas are ignored until the first keyframe
+    world.evolve()
+    delta = encoder.delta()
+    if apply(state, delta) == hexstream.DELTA:
+        assert not state.synchronized and state.population == 0
+    apply(state, encoder.keyframe())
+    kinds = set()
+    for generation in range(0, 20):
+        world.evolve()
+        kinds.add( apply(state, encoder.delta()) )
+        assert_same(state, world)
+    assert hexstream.DELTA in kinds
+
+def test_active_world_sends_keyframes():
+    world = hexworld.HexWorld(20)
+    world.random(0.9, 19, rng=3)
+    encoder = hexstream.StreamEncoder(world)
+    state = hexstream.StreamState(20)
+    world.evolve()
+    # nearly every cell changes, a keyframe is smaller than the delta
+    assert apply(state, encoder.delta()) == hexstream.KEYFRAME
+    assert_same(state, world)
@@ -0,0 +1,55 @@
+import csv
+import hexsweep
+
+def write_rows(path, points, seeds):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(hexsweep.COLUMNS)
+        for environment, fertility, factor in points:
+            for seed in range(0, seeds):
+                writer.writerow( (environment, fertility, factor, seed, 'extinct', 3, 0, 0) )
+
+def test_rule_names():
+    for rule in ( {2, 3}, {10}, {0, 1}, {1, 10}, {0, 11} ):
+        assert hexsweep.parse_rule( hexsweep.rule_name(rule) ) == rule
+    assert hexsweep.rule_name({1, 10}) != hexsweep.rule_name({0, 11})
+
+def test_rules_points_are_distinct_rules():
+    points = list( hexsweep.rules_points(None, [1, 3]) )
+    assert len(points) == len( set(points) ) == 3 * 63 * 63
+    assert ( '2-12', '4', 1 ) in points
+    assert ( '1-2-4-5-6-8', '2', 3 ) in points
+
+def test_finished_points(tmp_path):
+    path = str(tmp_path / 'sweep.csv')
+    points = [ ('2-3', '2', 0), ('2-3', '2', 3) ]
+    write_rows(path, points, 4)
+    assert hexsweep.finished_points(path, 4) == set(points)
+    assert hexsweep.finished_points(path, 8) == set()
+
+def test_resume_after_torn_rows(tmp_path):
+    path = str(tmp_path / 'sweep.csv')
+    write_rows(path, [ ('2-3', '2', 0), ('3-4', '2', 0) ], 4)
+    with open(path, 'rb') as f:
+        data = f.read()
+    complete = data.index(b'3-4')
+    # the second rule point was interrupted in the middle of a row
+    with open(path, 'wb') as f:
+        f.write( data[:complete + 20] )
+    assert hexsweep.finished_points(path, 4) == { ('2-3', '2', 0) }
+    with open(path, 'rb') as f:
+        assert f.read() == data[:complete]
+    # appending after the truncation gives a well formed file
+    with open(path, 'a', newline='') as f:
+        csv.writer(f).writerow( ('3-4', '2', 0, 0, 'extinct', 3, 0, 0) )
+    with open(path, newline='') as f:
+        rows = list( csv.DictReader(f) )
+    assert [ row['environment'] for row in rows ] == [ '2-3' ] * 4 + [ '3-4' ]
+
+def test_torn_header(tmp_path):
+    path = str(tmp_path / 'sweep.csv')
+    with open(path, 'w') as f:
+        f.write('environment,fertil')
+    assert hexsweep.finished_points(path, 4) == set()
+    with open(path, 'rb') as f:
+        assert f.read() == b''
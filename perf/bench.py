@@ -0,0 +1,263 @@
+"""
+Benchmark suite of the hexagonal game of life.
+
+Sweeps engines, map radii, initial densities, rule sets and the use of
+the extended neighbors. For each combination it measures:
+  - the construction time of the world
+  - the latency of each generation (mean, percentiles and max)
+  - the peak memory allocated while building and evolving the world,
+    in a separate run traced with tracemalloc
+  - the time of HexMap.draw_cells on an offscreen surface, when pygame
+    is available
+
+The results are written as JSON. Given a baseline file (a previous
+output), every result is compared to the baseline one with the same
+parameters, and the run fails when a time or the memory grew by more
+than the tolerance. The times are first scaled by the ratio of the
+calibration times of both runs, a fixed workload independent of the
+game code, so that a slower or busier machine is not reported as a
+regression. The combinations regressing are measured again, keeping the
+best times, before being reported.
+
+run with:
+
+  python3 bench.py results.json --radii 20 50 --engines set array
+  python3 bench.py results.json --baseline baseline.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+import timeit
+import tracemalloc
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hexca'))
+
+import hexu
+import hexworld
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+try:
+    import hexmap
+    import pygame
+except ImportError:
+    hexmap = None
+
+def parse_rules(text):
+    """ Returns the (environment, fertility) rules of a string such as
+        '23/2'.
+    """
+    environment, fertility = text.split('/')
+    return ( set( int(c) for c in environment ), set( int(c) for c in fertility ) )
+
+def latency(times):
+    """ Returns the statistics of a list of durations, in milliseconds."""
+    ms = numpy.array(times) * 1000.0
+    return { 'mean': float( ms.mean() ), 'p50': float( numpy.percentile(ms, 50) ),
+             'p90': float( numpy.percentile(ms, 90) ), 'p99': float( numpy.percentile(ms, 99) ),
+             'max': float( ms.max() ) }
+
+def calibration():
+    """ Returns the median time in milliseconds of a fixed workload made
+        of array operations and of Python set operations.
+    """
+    rng = numpy.random.default_rng(0)
+    grid = ( rng.random((512, 512)) < 0.5 ).astype(numpy.uint8)
+    cells = set( range(0, 200000, 3) )
+    times = []
+    for k in range(0, 5):
+        start = timeit.default_timer()
+        count = numpy.zeros_like(grid)
+        for dq, dr in ( (1, 0), (1, -1), (0, -1), (-1, 0), (-1, 1), (0, 1) ):
+            count += numpy.roll(grid, (dq, dr), axis=(0, 1))
+        grid = ( count == 3 ).astype(numpy.uint8)
+        found = sum( 1 for i in range(0, 200000) if i in cells )
+        times.append( timeit.default_timer() - start )
+    return 1000.0 * float( numpy.median(times) )
+
+def seeded_world(config, factory=hexworld.HexWorld):
+    """ Returns a world built by factory(radius, engine), with the rules
+        and the random seed of a configuration.
+    """
+    random.seed(config['seed'])
+    world = factory(config['radius'], config['engine'])
+    environment, fertility = parse_rules(config['rules'])
+    world.set_rules(environment, fertility)
+    world.use_extended_neighbors = config['extended']
+    world.random( config['density'], max(1, int(0.75 * config['radius'])) )
+    return world
+
+def close(world):
+    if hasattr(world.engine, 'close'):
+        world.engine.close()
+
+def measure(config, generations, warmup, render):
+    result = dict(config)
+
+    start = timeit.default_timer()
+    world = seeded_world(config)
+    result['construction_s'] = timeit.default_timer() - start
+    for i in range(0, warmup):
+        world.evolve()
+    times = []
+    for i in range(0, generations):
+        start = timeit.default_timer()
+        world.evolve()
+        times.append( timeit.default_timer() - start )
+    result['generation_ms'] = latency(times)
+    result['population'] = len(world.cells)
+    close(world)
+
+    # tracemalloc slows the evolution down, so memory is measured apart
+    tracemalloc.start()
+    world = seeded_world(config)
+    for i in range(0, min(generations, 10)):
+        world.evolve()
+    result['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    close(world)
+
+    if render and hexmap is not None:
+        hex_radius = 4
+        width, height = hexu.map_px_size(config['radius'], hex_radius)
+        size = ( width + 8, height + 8 )
+        world = seeded_world( config, lambda radius, engine:
+                              hexmap.HexMap(radius, hex_radius, size, engine) )
+        surface = pygame.Surface(size, depth=32)
+        times = []
+        for i in range(0, min(generations, 20)):
+            world.evolve()
+            start = timeit.default_timer()
+            world.draw_cells(surface)
+            times.append( timeit.default_timer() - start )
+        result['render_ms'] = latency(times)
+        close(world)
+    return result
+
+def best(result, other):
+    """ Returns result with the lowest times of result and of other, a
+        new measure of the same combination.
+    """
+    result = dict(result)
+    result['construction_s'] = min( result['construction_s'], other['construction_s'] )
+    for name in ( 'generation_ms', 'render_ms' ):
+        if name in result and name in other:
+            result[name] = { s: min( result[name][s], other[name][s] ) for s in result[name] }
+    return result
+
+def key(result):
+    return ( result['engine'], result['radius'], result['density'],
+             result['rules'], result['extended'] )
+
+# Differences below these values are measurement noise, never regressions
+NOISE = { 'construction_s': 0.005, 'generation_ms.p50': 0.2, 'generation_ms.p90': 0.2,
+          'peak_memory_bytes': 65536, 'render_ms.p50': 1.0 }
+
+def compare(results, baseline, tolerance):
+    """ Returns the list of the regressions of results over a baseline, as
+        (result, metric, expected value, value) tuples. results and
+        baseline are whole outputs, with their meta data.
+    """
+    reference = { key(r): r for r in baseline['results'] }
+    scale = results['meta']['calibration_ms'] / baseline['meta']['calibration_ms']
+    regressions = []
+    for result in results['results']:
+        base = reference.get( key(result) )
+        if base is None:
+            continue
+        metrics = [ ('construction_s', lambda r: r['construction_s']),
+                    ('generation_ms.p50', lambda r: r['generation_ms']['p50']),
+                    ('generation_ms.p90', lambda r: r['generation_ms']['p90']),
+                    ('peak_memory_bytes', lambda r: r['peak_memory_bytes']) ]
+        if 'render_ms' in result and 'render_ms' in base:
+            metrics.append( ('render_ms.p50', lambda r: r['render_ms']['p50']) )
+        for name, value in metrics:
+            expected = value(base) if name == 'peak_memory_bytes' else value(base) * scale
+            if ( value(result) > expected * (1.0 + tolerance) and
+                 value(result) - expected > NOISE[name] ):
+                regressions.append( (result, name, expected, value(result)) )
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks of the hexagonal game of life.')
+    parser.add_argument('output', help='JSON results file')
+    parser.add_argument('--engines', nargs='+', default=['set', 'array', 'delta'])
+    parser.add_argument('--radii', type=int, nargs='+', default=[50, 150])
+    parser.add_argument('--densities', type=float, nargs='+', default=[0.25, 0.75])
+    parser.add_argument('--rules', nargs='+', default=['23/2', '345/34'],
+                        help='environment/fertility rule sets')
+    parser.add_argument('--extended', choices=['on', 'off', 'both'], default='both',
+                        help='use of the extended neighbors')
+    parser.add_argument('--generations', type=int, default=50, help='generations timed')
+    parser.add_argument('--warmup', type=int, default=5, help='generations before timing')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-render', action='store_true', help='skip the rendering benchmark')
+    parser.add_argument('--baseline', default=None, help='JSON results to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='relative growth over the baseline considered a regression')
+    parser.add_argument('--retries', type=int, default=2,
+                        help='measures of the combinations regressing before reporting them')
+    args = parser.parse_args()
+
+    extended = { 'on': [True], 'off': [False], 'both': [True, False] }[args.extended]
+    calibration_ms = calibration()
+    results = []
+    for engine in args.engines:
+        for radius in args.radii:
+            for density in args.densities:
+                for rules in args.rules:
+                    for ext in extended:
+                        config = { 'engine': engine, 'radius': radius, 'density': density,
+                                   'rules': rules, 'extended': ext, 'seed': args.seed }
+                        result = measure(config, args.generations, args.warmup, not args.no_render)
+                        results.append(result)
+                        print( '%-8s R=%-4d d=%.2f %-7s ext=%-5s: build %7.3f s, p50 %8.2f ms, '
+                               'p99 %8.2f ms, peak %7.1f MB%s' % ( engine, radius, density, rules, ext,
+                               result['construction_s'], result['generation_ms']['p50'],
+                               result['generation_ms']['p99'], result['peak_memory_bytes'] / 2**20,
+                               ', render %.2f ms' % result['render_ms']['p50']
+                               if 'render_ms' in result else '' ) )
+
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    output = { 'meta': { 'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                         'python': platform.python_version(), 'numpy': numpy.__version__,
+                         'platform': platform.platform(), 'cpus': os.cpu_count(),
+                         'generations': args.generations, 'warmup': args.warmup,
+                         'calibration_ms': calibration_ms },
+               'results': results }
+    if baseline is not None:
+        for i in range(0, args.retries):
+            regressing = set( key(r) for r, name, expected, value in compare(output, baseline, args.tolerance) )
+            if not regressing:
+                break
+            print('measuring again %d combinations regressing' % len(regressing))
+            for j, result in enumerate(results):
+                if key(result) in regressing:
+                    config = { k: result[k] for k in ( 'engine', 'radius', 'density', 'rules',
+                                                       'extended', 'seed' ) }
+                    results[j] = best( result, measure(config, args.generations, args.warmup,
+                                                       not args.no_render) )
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=1)
+
+    if baseline is not None:
+        regressions = compare(output, baseline, args.tolerance)
+        for result, name, base, value in regressions:
+            print( 'REGRESSION %s R=%d d=%.2f %s ext=%s: %s %.4g -> %.4g (%+.0f%%)'
+                   % ( result['engine'], result['radius'], result['density'], result['rules'],
+                       result['extended'], name, base, value, 100.0 * (value - base) / base ) )
+        print('%d regressions over the baseline' % len(regressions))
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Overhead of the incremental hashing used to detect periodic worlds.
+
+Evolves the same world with and without HexWorld.track_cycles, for each
+engine given on the command line.
+
+run with:
+
+  python3 cycle_overhead.py 200 100 set array
+"""
+
+import os
+import sys
+import random
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hexca'))
+
+import hexworld
+
+def elapsed(engine, radius, loops, track):
+    random.seed(0)
+    world = hexworld.HexWorld(radius, engine)
+    world.random(0.75, radius // 2)
+    if track:
+        # a large history, so that the run is never stopped
+        world.track_cycles(history=loops + 1)
+    start = timeit.default_timer()
+    for i in range(loops):
+        world.evolve()
+    return timeit.default_timer() - start
+
+def main():
+    if len(sys.argv[1:]) < 3:
+        print("Usage: cycle_overhead.py map_radius number_of_cycles engine...")
+        sys.exit(1)
+
+    radius = int(sys.argv[1])
+    loops = int(sys.argv[2])
+    for engine in sys.argv[3:]:
+        plain = elapsed(engine, radius, loops, False)
+        tracked = elapsed(engine, radius, loops, True)
+        print("%-8s: %.3f s without hashing, %.3f s with hashing (%+.1f%%)"
+                % (engine, plain, tracked, 100.0 * (tracked - plain) / plain))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Memory used per cell by the neighbors table of an HexWorld.
+
+Compares the original dictionary of sets of tuples with the compact CSR
+index of hextopo.HexTopology.
+
+run with:
+
+  python3 neighbor_memory.py 200
+"""
+
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hexca'))
+
+import hexu
+import hextopo
+
+def legacy_neighbors(map_radius):
+    """ Neighbors table as it was built by HexWorld before hextopo."""
+    neighbors = {}
+    for c in hexu.hexagonal_map_gen(map_radius):
+        direct_neighbors = set()
+        extended_neighbors = set()
+        for n in hexu.cell_neighbors(c):
+            if hexu.cells_distance((0,0), n) <= map_radius:
+                direct_neighbors.add(n)
+        for n in hexu.cell_ring(c, 2):
+            if hexu.cells_distance((0,0), n) <= map_radius:
+                extended_neighbors.add(n)
+        neighbors[c] = (direct_neighbors, extended_neighbors)
+    return neighbors
+
+def measure(builder, map_radius):
+    tracemalloc.start()
+    table = builder(map_radius)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return table, size
+
+def main():
+    if len(sys.argv[1:]) < 1:
+        print("Usage: neighbor_memory.py map_radius")
+        sys.exit(1)
+
+    radius = int(sys.argv[1])
+    legacy, legacy_size = measure(legacy_neighbors, radius)
+    cells = len(legacy)
+    del legacy
+    topology, topology_size = measure(hextopo.HexTopology, radius)
+
+    print("map radius = %d, number of cells = %d" % (radius, cells))
+    print("dict of sets  : %8.1f bytes/cell" % (legacy_size / cells))
+    print("HexTopology   : %8.1f bytes/cell (arrays: %.1f bytes/cell)"
+            % (topology_size / cells, topology.nbytes / cells))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Cost of a generation once a world has settled.
+
+A large world is evolved until most of it is made of still lifes and
+oscillators, then the following generations are timed for each engine
+given on the command line. The delta engine only evaluates the cells
+around the births and deaths, so it should follow the activity of the
+world rather than its size.
+
+run with:
+
+  python3 settled_world.py 150 50 set array delta
+"""
+
+import os
+import sys
+import random
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hexca'))
+
+import hexworld
+
+def elapsed(engine, radius, loops):
+    random.seed(1)
+    world = hexworld.HexWorld(radius, engine)
+    world.set_rules({3, 4, 5}, {3, 4})
+    world.random(0.5, radius - 10)
+    for i in range(60):
+        world.evolve()
+    start = timeit.default_timer()
+    for i in range(loops):
+        world.evolve()
+    return timeit.default_timer() - start, len(world.cells), len(world.births)
+
+def main():
+    if len(sys.argv[1:]) < 3:
+        print("Usage: settled_world.py map_radius number_of_cycles engine...")
+        sys.exit(1)
+
+    radius = int(sys.argv[1])
+    loops = int(sys.argv[2])
+    for engine in sys.argv[3:]:
+        seconds, population, births = elapsed(engine, radius, loops)
+        print("%-8s: %.2f ms/generation (%d cells, %d births)"
+                % (engine, 1000.0 * seconds / loops, population, births))
+
+if __name__ == "__main__":
+    main()
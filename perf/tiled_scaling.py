@@ -0,0 +1,57 @@
+"""
+Scaling of the tiled engine with the number of worker processes.
+
+Prints one line per number of workers with the generations per second and
+the speedup versus the single process array engine.
+
+run with:
+
+  python3 tiled_scaling.py 400 50 8
+"""
+
+import os
+import sys
+import random
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hexca'))
+
+import hexworld
+
+def generations_per_second(world, cells, colors, loops):
+    world.cells = set(cells)
+    world.colors = dict(colors)
+    # first generation starts the workers
+    world.evolve()
+    start = timeit.default_timer()
+    for i in range(loops):
+        world.evolve()
+    stop = timeit.default_timer()
+    return loops / (stop - start)
+
+def main():
+    if len(sys.argv[1:]) < 3:
+        print("Usage: tiled_scaling.py map_radius number_of_cycles max_workers")
+        sys.exit(1)
+
+    radius = int(sys.argv[1])
+    loops = int(sys.argv[2])
+    max_workers = int(sys.argv[3])
+
+    random.seed(0)
+    seed = hexworld.HexWorld(radius)
+    seed.random(0.5, radius // 2)
+
+    reference = generations_per_second( hexworld.HexWorld(radius, 'array'),
+                                        seed.cells, seed.colors, loops )
+    print("cpus = %d, map radius = %d" % (os.cpu_count(), radius))
+    print("workers, generations/s, speedup")
+    print("array, %.1f, 1.00" % reference)
+    for workers in range(1, max_workers + 1):
+        world = hexworld.HexWorld(radius, 'tiled', workers=workers)
+        rate = generations_per_second(world, seed.cells, seed.colors, loops)
+        world.engine.close()
+        print("%d, %.1f, %.2f" % (workers, rate, rate / reference))
+
+if __name__ == "__main__":
+    main()